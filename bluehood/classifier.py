@@ -1,6 +1,7 @@
 """Device type classification based on vendor and patterns."""
 
 import re
+from functools import lru_cache
 from typing import Optional
 
 # macOS CoreBluetooth provides UUIDs instead of real MAC addresses for privacy.
@@ -94,9 +95,29 @@ TYPE_LABELS = {
     TYPE_UNKNOWN: "Unknown",
 }
 
+
+class _FallbackDict(dict):
+    """Dict that returns a fixed fallback for missing keys without storing them."""
+
+    def __init__(self, mapping: dict, fallback):
+        super().__init__(mapping)
+        self._fallback = fallback
+
+    def __missing__(self, key):
+        return self._fallback
+
+
+_ICON_MAP = _FallbackDict(TYPE_ICONS, TYPE_ICONS[TYPE_UNKNOWN])
+_LABEL_MAP = _FallbackDict(TYPE_LABELS, TYPE_LABELS[TYPE_UNKNOWN])
+
+_ALL_TYPES = tuple(
+    (dtype, TYPE_ICONS[dtype], TYPE_LABELS[dtype])
+    for dtype in TYPE_LABELS.keys()
+)
+
 # Vendor patterns for classification
 # Format: (pattern_to_match_in_vendor, device_type)
-# Patterns are matched case-insensitively
+# Patterns must be lowercase; vendors are lowercased once before matching
 VENDOR_PATTERNS = [
     # Phones / Mobile devices
     ("apple", TYPE_PHONE),  # Could be phone, tablet, laptop, watch - default to phone
@@ -235,6 +256,118 @@ VENDOR_PATTERNS = [
     ("orbi", TYPE_NETWORK),
 ]
 
+
+def _keyword_trie_regex(keywords: tuple[str, ...]) -> str:
+    """Build a regex that matches the longest keyword at a position.
+
+    Keywords are folded into a trie so the regex engine follows a single
+    branch per character instead of trying every keyword in turn.
+    """
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # A keyword ends here: the longer continuations are optional
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _compile_keyword_matcher(keywords: tuple[str, ...]) -> tuple[re.Pattern, dict[str, int]]:
+    """Compile keywords into a single-pass matcher.
+
+    Returns a regex whose ``finditer`` yields the longest keyword starting at
+    every position (overlaps included), plus a map from each keyword to the
+    lowest list index among the keywords that are its prefixes. Taking the
+    minimum rank over all hits gives the same result as testing keywords one
+    by one in list order.
+
+    Keywords must be lowercase, since input is only case-folded once.
+    """
+    uppercase = [keyword for keyword in keywords if keyword != keyword.lower()]
+    if uppercase:
+        raise ValueError(f"Keyword patterns must be lowercase: {uppercase}")
+
+    matcher = re.compile(f"(?=({_keyword_trie_regex(keywords)}))")
+    ranks = {}
+    for keyword in keywords:
+        ranks[keyword] = min(
+            index for index, prefix in enumerate(keywords) if keyword.startswith(prefix)
+        )
+    return matcher, ranks
+
+
+# Patterns and types as parallel tuples, indexed by matcher rank
+_VENDOR_KEYS, _VENDOR_TYPES = (tuple(column) for column in zip(*VENDOR_PATTERNS))
+
+# All vendor patterns scanned in one pass instead of one substring search each
+_VENDOR_MATCHER, _VENDOR_RANKS = _compile_keyword_matcher(_VENDOR_KEYS)
+
+# Cheap existence check for the common case where no vendor pattern matches;
+# a plain search is much cheaper than collecting every overlapping hit
+_VENDOR_PREFILTER = re.compile(_keyword_trie_regex(_VENDOR_KEYS))
+
+# Device name patterns for classification (some devices advertise their type)
+# Format: (pattern_to_match_in_name, device_type)
+# Patterns must be lowercase; earlier entries take priority
+NAME_PATTERNS = [
+    ("iphone", TYPE_PHONE),
+    ("android", TYPE_PHONE),
+    ("pixel", TYPE_PHONE),
+    ("galaxy s", TYPE_PHONE),
+    ("galaxy z", TYPE_PHONE),
+
+    ("ipad", TYPE_TABLET),
+    ("tab", TYPE_TABLET),
+    ("tablet", TYPE_TABLET),
+
+    ("macbook", TYPE_LAPTOP),
+    ("thinkpad", TYPE_LAPTOP),
+    ("xps", TYPE_LAPTOP),
+    ("laptop", TYPE_LAPTOP),
+
+    ("imac", TYPE_COMPUTER),
+    ("mac mini", TYPE_COMPUTER),
+    ("mac pro", TYPE_COMPUTER),
+    ("desktop", TYPE_COMPUTER),
+
+    ("watch", TYPE_WATCH),
+    ("band", TYPE_WATCH),
+    ("mi band", TYPE_WATCH),
+
+    ("airpod", TYPE_HEADPHONES),
+    ("buds", TYPE_HEADPHONES),
+    ("earbuds", TYPE_HEADPHONES),
+    ("headphone", TYPE_HEADPHONES),
+
+    ("homepod", TYPE_SPEAKER),
+    ("echo", TYPE_SPEAKER),
+    ("speaker", TYPE_SPEAKER),
+
+    ("tv", TYPE_TV),
+    ("roku", TYPE_TV),
+    ("firestick", TYPE_TV),
+    ("chromecast", TYPE_TV),
+
+    ("car", TYPE_VEHICLE),
+    ("vehicle", TYPE_VEHICLE),
+    ("model 3", TYPE_VEHICLE),
+    ("model y", TYPE_VEHICLE),
+    ("model s", TYPE_VEHICLE),
+]
+
+_NAME_KEYS, _NAME_TYPES = (tuple(column) for column in zip(*NAME_PATTERNS))
+
+_NAME_MATCHER, _NAME_RANKS = _compile_keyword_matcher(_NAME_KEYS)
+
 # BLE Service UUID patterns for device fingerprinting
 # Maps UUID patterns to device types (more specific = higher priority)
 # UUIDs can be 16-bit (0x180D), 32-bit, or full 128-bit
@@ -390,6 +523,48 @@ def classify_by_device_class(device_class: Optional[int]) -> Optional[str]:
     return DEVICE_CLASS_MAJOR_MAP.get(major)
 
 
+@lru_cache(maxsize=4096)
+def classify_by_name(name: Optional[str]) -> Optional[str]:
+    """Classify a device based on its advertised name.
+
+    Returns the type of the first entry in NAME_PATTERNS found in the
+    name, or None if no pattern matches.
+    """
+    if not name:
+        return None
+
+    best = min(
+        (_NAME_RANKS[match.group(1)] for match in _NAME_MATCHER.finditer(name.lower())),
+        default=None,
+    )
+    if best is None:
+        return None
+    return _NAME_TYPES[best]
+
+
+@lru_cache(maxsize=4096)
+def classify_by_vendor(vendor: Optional[str]) -> Optional[str]:
+    """Classify a device based on its vendor string.
+
+    Returns the type of the first entry in VENDOR_PATTERNS found in the
+    vendor name, or None if no pattern matches.
+    """
+    if not vendor:
+        return None
+
+    vendor_lower = vendor.lower()
+    if not _VENDOR_PREFILTER.search(vendor_lower):
+        return None
+
+    best = min(
+        (_VENDOR_RANKS[match.group(1)] for match in _VENDOR_MATCHER.finditer(vendor_lower)),
+        default=None,
+    )
+    if best is None:
+        return None
+    return _VENDOR_TYPES[best]
+
+
 def classify_device(
     vendor: Optional[str],
     name: Optional[str] = None,
@@ -409,28 +584,9 @@ def classify_device(
             return uuid_type
 
     # Check name if provided (some devices advertise their type)
-    if name:
-        name_lower = name.lower()
-
-        # Common name patterns
-        if any(x in name_lower for x in ["iphone", "android", "pixel", "galaxy s", "galaxy z"]):
-            return TYPE_PHONE
-        if any(x in name_lower for x in ["ipad", "tab", "tablet"]):
-            return TYPE_TABLET
-        if any(x in name_lower for x in ["macbook", "thinkpad", "xps", "laptop"]):
-            return TYPE_LAPTOP
-        if any(x in name_lower for x in ["imac", "mac mini", "mac pro", "desktop"]):
-            return TYPE_COMPUTER
-        if any(x in name_lower for x in ["watch", "band", "mi band"]):
-            return TYPE_WATCH
-        if any(x in name_lower for x in ["airpod", "buds", "earbuds", "headphone"]):
-            return TYPE_HEADPHONES
-        if any(x in name_lower for x in ["homepod", "echo", "speaker"]):
-            return TYPE_SPEAKER
-        if any(x in name_lower for x in ["tv", "roku", "firestick", "chromecast"]):
-            return TYPE_TV
-        if any(x in name_lower for x in ["car", "vehicle", "model 3", "model y", "model s"]):
-            return TYPE_VEHICLE
+    name_type = classify_by_name(name)
+    if name_type:
+        return name_type
 
     # Try Classic BT device class (more reliable than vendor guessing)
     if device_class is not None:
@@ -439,28 +595,23 @@ def classify_device(
             return class_type
 
     # Fall back to vendor-based classification
-    if vendor:
-        vendor_lower = vendor.lower()
-        for pattern, device_type in VENDOR_PATTERNS:
-            if pattern in vendor_lower:
-                return device_type
+    vendor_type = classify_by_vendor(vendor)
+    if vendor_type:
+        return vendor_type
 
     return TYPE_UNKNOWN
 
 
 def get_type_icon(device_type: str) -> str:
     """Get the icon for a device type."""
-    return TYPE_ICONS.get(device_type, TYPE_ICONS[TYPE_UNKNOWN])
+    return _ICON_MAP[device_type]
 
 
 def get_type_label(device_type: str) -> str:
     """Get the human-readable label for a device type."""
-    return TYPE_LABELS.get(device_type, TYPE_LABELS[TYPE_UNKNOWN])
+    return _LABEL_MAP[device_type]
 
 
-def get_all_types() -> list[tuple[str, str, str]]:
+def get_all_types() -> tuple[tuple[str, str, str], ...]:
     """Get all device types with their icons and labels."""
-    return [
-        (dtype, TYPE_ICONS[dtype], TYPE_LABELS[dtype])
-        for dtype in TYPE_LABELS.keys()
-    ]
+    return _ALL_TYPES
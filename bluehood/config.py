@@ -10,6 +10,11 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 # Database path (can be overridden directly)
 DB_PATH = Path(os.environ.get("BLUEHOOD_DB_PATH", DATA_DIR / "bluehood.db"))
 
+# SQLite memory budget in MB: page cache and memory-mapped I/O per connection.
+# Lower these on small hosts such as a Raspberry Pi.
+DB_CACHE_SIZE_MB = int(os.environ.get("BLUEHOOD_DB_CACHE_MB", "64"))
+DB_MMAP_SIZE_MB = int(os.environ.get("BLUEHOOD_DB_MMAP_MB", "256"))
+
 # Socket path for daemon communication
 SOCKET_PATH = Path("/tmp/bluehood.sock")
 
@@ -19,5 +24,10 @@ SCAN_INTERVAL = 10
 # How long to scan for each cycle (seconds)
 SCAN_DURATION = 5
 
+# Days of sighting history to keep (0 = keep everything), and how often the
+# daemon prunes older sightings (seconds)
+RETENTION_DAYS = int(os.environ.get("BLUEHOOD_RETENTION_DAYS", "90"))
+RETENTION_INTERVAL = 6 * 3600
+
 # Bluetooth adapter (None = auto-select, or specify like "hci0")
 BLUETOOTH_ADAPTER = os.environ.get("BLUEHOOD_ADAPTER", None)
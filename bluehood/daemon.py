@@ -7,14 +7,23 @@ import logging
 import os
 import signal
 import sys
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 from . import db
-from .config import SCAN_INTERVAL, SOCKET_PATH
-from .scanner import BluetoothScanner, ScannedDevice, list_adapters
+from .classifier import classify_device, get_all_types
+from .config import RETENTION_DAYS, RETENTION_INTERVAL, SCAN_INTERVAL, SOCKET_PATH
+from .scanner import BluetoothScanner, ScannedDevice, list_adapters, list_adapters_async
 from .web import WebServer
 from .notifications import NotificationManager
+from .patterns import describe_time_pattern
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,17 +33,123 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+if HAS_ORJSON:
+    def _dumps(obj) -> bytes:
+        """Encode a message as JSON bytes."""
+        # Allow int-keyed dicts, which the stdlib encoder accepts too
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    _loads = orjson.loads
+else:
+    def _dumps(obj) -> bytes:
+        """Encode a message as JSON bytes."""
+        return json.dumps(obj).encode()
+
+    _loads = json.loads
+
+
+def _counts_list(counts: dict[int, int], size: int) -> list[int]:
+    """Flatten an hour/weekday distribution into a list indexed by its key.
+
+    JSON object keys always decode as strings, so lists spare clients from
+    rebuilding the dict with int keys.
+    """
+    return [counts.get(i, 0) for i in range(size)]
+
+
+# Socket messages are framed with a 4-byte big-endian length prefix.
+# Version 1 of the protocol was newline-delimited JSON; clients that still
+# speak it are detected by their first byte and answered the same way.
+PROTOCOL_VERSION = 2
+FRAME_HEADER_SIZE = 4
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def _frame(payload: bytes) -> bytes:
+    """Prefix a payload with its length for sending over the socket."""
+    return len(payload).to_bytes(FRAME_HEADER_SIZE, "big") + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader, prefix: bytes = b"") -> Optional[bytes]:
+    """Read one length-prefixed payload, or None if the client disconnected.
+
+    prefix holds any bytes of the header that were already read.
+    """
+    try:
+        header = prefix + await reader.readexactly(FRAME_HEADER_SIZE - len(prefix))
+        size = int.from_bytes(header, "big")
+        if size > MAX_FRAME_SIZE:
+            logger.warning(f"Client frame too large ({size} bytes)")
+            return None
+        return await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+
+
+async def _read_line(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """Read one newline-delimited message, or None if the client disconnected."""
+    return await reader.readline() or None
+
+
+async def _read_first_message(reader: asyncio.StreamReader) -> tuple[bool, Optional[bytes]]:
+    """Read a client's first message and whether it uses newline framing.
+
+    A newline-delimited JSON request starts with "{", which a length prefix
+    never does since frames are capped far below 0x7b000000 bytes.
+    """
+    first = await reader.read(1)
+    if not first:
+        return False, None
+    if first == b"{":
+        return True, first + await reader.readline()
+    return False, await _read_frame(reader, first)
+
+
+# Most tagged requests a client may have running at once; reading from the
+# client pauses at the cap until one of them finishes
+MAX_PENDING_REQUESTS = 32
+
+
+def _request_id(request: object) -> object:
+    """Get the id a request is tagged with, or None for an untagged one."""
+    return request.get("id") if isinstance(request, dict) else None
+
+
+def _is_row_count(value: object) -> bool:
+    """Check that a request value is a usable row count (an int >= 0)."""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+
+def _sightings_list(sightings: list) -> list[dict]:
+    """Serialize sightings for a socket response."""
+    return [
+        {"timestamp": s.timestamp.isoformat() + "Z", "rssi": s.rssi}
+        for s in sightings
+    ]
+
+
+# The device type list never changes, so encode and frame its response once
+_DEVICE_TYPES_RESPONSE = {
+    "status": "ok",
+    "types": [{"id": t[0], "icon": t[1], "label": t[2]} for t in get_all_types()]
+}
+_DEVICE_TYPES_FRAME = _frame(_dumps(_DEVICE_TYPES_RESPONSE))
+
+
 class BluehoodDaemon:
     """Main daemon process for Bluetooth scanning."""
 
     def __init__(self, adapter: Optional[str] = None, web_port: Optional[int] = None):
         self.scanner = BluetoothScanner(adapter=adapter)
         self.running = False
-        self.clients: list[asyncio.StreamWriter] = []
+        self.clients: set[asyncio.StreamWriter] = set()
+        # Clients speaking the newline-delimited version 1 protocol
+        self._line_clients: set[asyncio.StreamWriter] = set()
         self._server: asyncio.Server | None = None
         self._web_port = web_port
         self._web_server: WebServer | None = None
         self._notifications = NotificationManager()
+        self._loops: list[asyncio.Task] = []
 
     async def start(self) -> None:
         """Start the daemon."""
@@ -63,16 +178,27 @@ class BluehoodDaemon:
 
         # Start scanning and absence checking
         self.running = True
-        asyncio.create_task(self._absence_check_loop())
-        await self._scan_loop()
+        self._loops = [
+            asyncio.create_task(self._scan_loop()),
+            asyncio.create_task(self._absence_check_loop()),
+            asyncio.create_task(self._maintenance_loop()),
+        ]
+        # Returns once stop() has cancelled the loops
+        await asyncio.gather(*self._loops, return_exceptions=True)
 
     async def stop(self) -> None:
         """Stop the daemon."""
         logger.info("Stopping bluehood daemon...")
         self.running = False
 
+        # Stop the loops first: a scan still in flight would otherwise write
+        # after close_db() and reopen connections that are never closed
+        for task in self._loops:
+            task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+
         # Close all client connections
-        for writer in self.clients:
+        for writer in list(self.clients):
             writer.close()
             await writer.wait_closed()
 
@@ -88,6 +214,12 @@ class BluehoodDaemon:
         # Stop notifications
         await self._notifications.stop()
 
+        # Close the scanner's HTTP session
+        await self.scanner.close()
+
+        # Close database connection
+        await db.close_db()
+
         # Remove socket file
         if SOCKET_PATH.exists():
             SOCKET_PATH.unlink()
@@ -114,62 +246,115 @@ class BluehoodDaemon:
         writer: asyncio.StreamWriter
     ) -> None:
         """Handle a TUI client connection."""
-        self.clients.append(writer)
+        self.clients.add(writer)
         logger.info("TUI client connected")
 
+        # Requests tagged with an "id" run concurrently and may be answered
+        # out of order; their responses echo the id so clients can match them
+        in_flight: set[asyncio.Task] = set()
+        pending = asyncio.Semaphore(MAX_PENDING_REQUESTS)
+
         try:
+            line_framed, data = await _read_first_message(reader)
+            if line_framed:
+                self._line_clients.add(writer)
+                logger.info("Client uses the newline-delimited protocol (version 1)")
+            read_message = _read_line if line_framed else _read_frame
+
             while self.running:
-                data = await reader.readline()
-                if not data:
-                    break
+                if data is None:
+                    data = await read_message(reader)
+                    if data is None:
+                        break
+
+                message, data = data, None
 
                 try:
-                    request = json.loads(data.decode())
-                    response = await self._handle_request(request)
-                    writer.write(json.dumps(response).encode() + b"\n")
-                    await writer.drain()
+                    request = _loads(message)
                 except json.JSONDecodeError:
                     logger.warning("Invalid JSON from client")
-                except Exception as e:
-                    logger.error(f"Error handling request: {e}")
+                    continue
+
+                if _request_id(request) is not None:
+                    await pending.acquire()
+                    task = asyncio.create_task(self._respond(writer, request))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    task.add_done_callback(lambda _: pending.release())
+                else:
+                    await self._respond(writer, request)
 
         except asyncio.CancelledError:
             pass
         finally:
-            self.clients.remove(writer)
+            for task in in_flight:
+                task.cancel()
+            self.clients.discard(writer)
+            self._line_clients.discard(writer)
             writer.close()
             await writer.wait_closed()
             logger.info("TUI client disconnected")
 
-    async def _handle_request(self, request: dict) -> dict:
-        """Handle a request from a TUI client."""
+    async def _respond(self, writer: asyncio.StreamWriter, request: dict) -> None:
+        """Handle a request and write its response to the client."""
+        request_id = _request_id(request)
+        version = 1 if writer in self._line_clients else PROTOCOL_VERSION
+        try:
+            response = await self._handle_request(request, version)
+        except Exception as e:
+            logger.error(f"Error handling request: {e}")
+            if request_id is None:
+                return
+            # Tagged clients wait on a specific id, so always answer them
+            response = {"status": "error", "message": str(e)}
+
+        try:
+            if isinstance(response, bytes):
+                if writer in self._line_clients:
+                    response = response[FRAME_HEADER_SIZE:] + b"\n"
+            else:
+                if request_id is not None:
+                    response["id"] = request_id
+                response = self._encode(writer, _dumps(response))
+            writer.write(response)
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Error sending response: {e}")
+
+    def _encode(self, writer: asyncio.StreamWriter, payload: bytes) -> bytes:
+        """Frame an encoded message the way the client's protocol expects."""
+        if writer in self._line_clients:
+            return payload + b"\n"
+        return _frame(payload)
+
+    async def _handle_request(self, request: dict, version: int = PROTOCOL_VERSION) -> dict | bytes:
+        """Handle a request from a TUI client.
+
+        version is the client's protocol version, for the few responses
+        whose shape changed. Returns the response message, or an already
+        framed response for static replies that are encoded once.
+        """
         cmd = request.get("cmd")
 
         if cmd == "list":
             include_ignored = request.get("include_ignored", True)
-            devices = await db.get_all_devices(include_ignored)
 
-            # Auto-classify devices that don't have a type
-            from .classifier import classify_device
             device_list = []
-            for d in devices:
-                device_type = d.device_type
-                if not device_type:
-                    device_type = classify_device(d.vendor, d.friendly_name, d.service_uuids, d.device_class)
-                    # Store the auto-classified type
-                    if device_type != "unknown":
-                        await db.set_device_type(d.mac, device_type)
-
-                device_list.append({
-                    "mac": d.mac,
-                    "vendor": d.vendor,
-                    "friendly_name": d.friendly_name,
-                    "device_type": device_type,
-                    "ignored": d.ignored,
-                    "first_seen": (d.first_seen.isoformat() + "Z") if d.first_seen else None,
-                    "last_seen": (d.last_seen.isoformat() + "Z") if d.last_seen else None,
-                    "total_sightings": d.total_sightings,
-                })
+            async for d in db.iter_devices(include_ignored):
+                # Only the classification fallback needs these, so keep them
+                # out of the response
+                service_uuids = d.pop("service_uuids")
+                device_class = d.pop("device_class")
+                # Devices are classified at ingest; fall back for older rows
+                if not d["device_type"]:
+                    d["device_type"] = classify_device(d["vendor"], d["friendly_name"], service_uuids, device_class)
+                device_list.append(d)
+
+            if request.get("include_pattern", False):
+                # Saves clients a get_hourly round trip per device
+                hourly = await db.get_hourly_distributions([d["mac"] for d in device_list])
+                for d in device_list:
+                    d["pattern"] = describe_time_pattern(hourly[d["mac"]])
 
             return {"status": "ok", "devices": device_list}
 
@@ -198,28 +383,20 @@ class BluehoodDaemon:
             return {"status": "error", "message": "Missing mac or device_type"}
 
         elif cmd == "get_device_types":
-            from .classifier import get_all_types
-            types = get_all_types()
-            return {
-                "status": "ok",
-                "types": [{"id": t[0], "icon": t[1], "label": t[2]} for t in types]
-            }
+            if _request_id(request) is not None:
+                # Tagged responses need the id added, so copy the message
+                return dict(_DEVICE_TYPES_RESPONSE)
+            return _DEVICE_TYPES_FRAME
 
         elif cmd == "get_sightings":
             mac = request.get("mac")
             days = request.get("days", 30)
+            limit = request.get("limit")
+            if limit is not None and not _is_row_count(limit):
+                return {"status": "error", "message": "Invalid limit"}
             if mac:
-                sightings = await db.get_sightings(mac, days)
-                return {
-                    "status": "ok",
-                    "sightings": [
-                        {
-                            "timestamp": s.timestamp.isoformat() + "Z",
-                            "rssi": s.rssi,
-                        }
-                        for s in sightings
-                    ]
-                }
+                sightings = await db.get_sightings(mac, days, limit)
+                return {"status": "ok", "sightings": _sightings_list(sightings)}
             return {"status": "error", "message": "Missing mac"}
 
         elif cmd == "get_hourly":
@@ -227,15 +404,50 @@ class BluehoodDaemon:
             days = request.get("days", 30)
             if mac:
                 hourly = await db.get_hourly_distribution(mac, days)
-                return {"status": "ok", "hourly": hourly}
+                # Version 1 clients expect the sparse {hour: count} object
+                counts = hourly if version == 1 else _counts_list(hourly, 24)
+                return {"status": "ok", "hourly": counts}
             return {"status": "error", "message": "Missing mac"}
 
+        elif cmd == "get_hourly_bulk":
+            macs = request.get("macs")
+            days = request.get("days", 30)
+            if isinstance(macs, list):
+                hourly = await db.get_hourly_distributions(macs, days)
+                return {
+                    "status": "ok",
+                    "hourly": {mac: _counts_list(counts, 24) for mac, counts in hourly.items()},
+                }
+            return {"status": "error", "message": "Missing macs"}
+
         elif cmd == "get_daily":
             mac = request.get("mac")
             days = request.get("days", 30)
             if mac:
                 daily = await db.get_daily_distribution(mac, days)
-                return {"status": "ok", "daily": daily}
+                counts = daily if version == 1 else _counts_list(daily, 7)
+                return {"status": "ok", "daily": counts}
+            return {"status": "error", "message": "Missing mac"}
+
+        elif cmd == "get_detail":
+            mac = request.get("mac")
+            days = request.get("days", 30)
+            limit = request.get("limit")
+            if limit is not None and not _is_row_count(limit):
+                return {"status": "error", "message": "Invalid limit"}
+            if mac:
+                # Everything the detail view needs in one round trip
+                hourly, daily, sightings = await asyncio.gather(
+                    db.get_hourly_distribution(mac, days),
+                    db.get_daily_distribution(mac, days),
+                    db.get_sightings(mac, days, limit),
+                )
+                return {
+                    "status": "ok",
+                    "hourly": _counts_list(hourly, 24),
+                    "daily": _counts_list(daily, 7),
+                    "sightings": _sightings_list(sightings),
+                }
             return {"status": "error", "message": "Missing mac"}
 
         elif cmd == "search":
@@ -244,21 +456,45 @@ class BluehoodDaemon:
             end_time = request.get("end_time")
 
             # Parse datetime strings if provided
-            from datetime import datetime
-            start_dt = datetime.fromisoformat(start_time) if start_time else None
-            end_dt = datetime.fromisoformat(end_time) if end_time else None
-
-            results = await db.search_devices(mac_filter, start_dt, end_dt)
+            try:
+                start_dt = datetime.fromisoformat(start_time) if start_time else None
+                end_dt = datetime.fromisoformat(end_time) if end_time else None
+            except ValueError:
+                return {"status": "error", "message": "Invalid datetime format"}
+
+            limit = request.get("limit")
+            offset = request.get("offset", 0)
+            if limit is not None and not _is_row_count(limit):
+                return {"status": "error", "message": "Invalid limit"}
+            if not _is_row_count(offset):
+                return {"status": "error", "message": "Invalid offset"}
+
+            results = await db.search_devices(
+                mac_filter, start_dt, end_dt, limit=limit, offset=offset
+            )
             return {
                 "status": "ok",
                 "results": results,
             }
 
+        elif cmd == "list_adapters":
+            # bluetoothctl runs as a subprocess, so don't block other clients
+            adapters = await list_adapters_async()
+            return {
+                "status": "ok",
+                "adapters": [
+                    {"name": a.name, "address": a.address, "alias": a.alias}
+                    for a in adapters
+                ],
+                "active": self.scanner.adapter,
+            }
+
         elif cmd == "status":
             return {
                 "status": "ok",
                 "running": self.running,
                 "clients": len(self.clients),
+                "protocol": PROTOCOL_VERSION,
             }
 
         elif cmd == "set_notes":
@@ -306,19 +542,28 @@ class BluehoodDaemon:
             try:
                 devices = await self.scanner.scan()
 
+                rows = []
                 for device in devices:
-                    db_device, is_new = await db.upsert_device(
-                        mac=device.mac,
-                        vendor=device.vendor,
-                        friendly_name=device.name,
-                        rssi=device.rssi,
-                        service_uuids=device.service_uuids,
-                        bt_type=device.bt_type,
-                        device_class=device.device_class,
-                    )
-
-                    # Trigger notification checks
-                    await self._notifications.on_device_seen(db_device, is_new)
+                    device_type = classify_device(device.vendor, device.name, device.service_uuids, device.device_class)
+                    rows.append({
+                        "mac": device.mac,
+                        "vendor": device.vendor,
+                        "friendly_name": device.name,
+                        "rssi": device.rssi,
+                        "service_uuids": device.service_uuids,
+                        "bt_type": device.bt_type,
+                        "device_class": device.device_class,
+                        "device_type": device_type if device_type != "unknown" else None,
+                    })
+
+                # Write the whole scan in one transaction. The stored devices
+                # are only needed when there are notifications to check.
+                notify = self._notifications.enabled
+                results = await db.upsert_devices(rows, return_devices=notify)
+                if notify:
+                    for db_device, is_new in results:
+                        # Trigger notification checks
+                        await self._notifications.on_device_seen(db_device, is_new)
 
                 # Notify connected clients
                 await self._notify_clients({
@@ -340,15 +585,36 @@ class BluehoodDaemon:
                 logger.error(f"Absence check error: {e}")
             await asyncio.sleep(60)  # Check every minute
 
+    async def _maintenance_loop(self) -> None:
+        """Periodically prune old sightings and refresh planner statistics."""
+        while self.running:
+            try:
+                if RETENTION_DAYS:
+                    deleted = await db.cleanup_old_sightings(RETENTION_DAYS)
+                    if deleted:
+                        logger.info(f"Removed {deleted} sightings older than {RETENTION_DAYS} days")
+                # Sightings grow with every scan, so statistics gathered at
+                # startup go stale on a long-running daemon
+                await db.optimize_db()
+            except Exception as e:
+                logger.error(f"Database maintenance error: {e}")
+            await asyncio.sleep(RETENTION_INTERVAL)
+
     async def _notify_clients(self, event: dict) -> None:
         """Send an event to all connected clients."""
-        data = json.dumps(event).encode() + b"\n"
-        for writer in self.clients:
-            try:
-                writer.write(data)
-                await writer.drain()
-            except Exception:
-                pass  # Client might have disconnected
+        payload = _dumps(event)
+        # Flush to all clients concurrently; errors are swallowed since a
+        # client might have disconnected
+        await asyncio.gather(
+            *(self._send(writer, self._encode(writer, payload)) for writer in list(self.clients)),
+            return_exceptions=True,
+        )
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, data: bytes) -> None:
+        """Write data to a client and wait for it to be flushed."""
+        writer.write(data)
+        await writer.drain()
 
 
 def main() -> None:
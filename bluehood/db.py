@@ -1,15 +1,21 @@
 """Database operations for bluehood."""
 
-import json
+import asyncio
+import logging
+import os
 import aiosqlite
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterator, Optional
 from dataclasses import dataclass
 
-from .config import DB_PATH
+from .config import DB_CACHE_SIZE_MB, DB_MMAP_SIZE_MB, DB_PATH
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True)
 class Device:
     """Represents a Bluetooth device."""
     mac: str
@@ -74,15 +80,15 @@ CREATE TABLE IF NOT EXISTS devices (
     friendly_name TEXT,
     device_type TEXT,
     ignored INTEGER DEFAULT 0,
-    first_seen TIMESTAMP,
-    last_seen TIMESTAMP,
+    first_seen INTEGER,
+    last_seen INTEGER,
     total_sightings INTEGER DEFAULT 0
 );
 
 CREATE TABLE IF NOT EXISTS sightings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     mac TEXT NOT NULL,
-    timestamp TIMESTAMP NOT NULL,
+    timestamp INTEGER NOT NULL,
     rssi INTEGER,
     FOREIGN KEY (mac) REFERENCES devices(mac)
 );
@@ -99,14 +105,244 @@ CREATE TABLE IF NOT EXISTS settings (
     value TEXT
 );
 
-CREATE INDEX IF NOT EXISTS idx_sightings_mac_time ON sightings(mac, timestamp);
-CREATE INDEX IF NOT EXISTS idx_sightings_timestamp ON sightings(timestamp);
+-- BLE service UUIDs advertised by each device
+CREATE TABLE IF NOT EXISTS device_service_uuids (
+    mac TEXT NOT NULL,
+    uuid TEXT NOT NULL,
+    PRIMARY KEY (mac, uuid)
+) WITHOUT ROWID;
+
+-- Sightings pre-aggregated per device and local hour for pattern analysis
+CREATE TABLE IF NOT EXISTS sighting_rollup_hour (
+    mac TEXT NOT NULL,
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum_rssi INTEGER NOT NULL DEFAULT 0,
+    n_rssi INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (mac, day, hour)
+) WITHOUT ROWID;
+
+-- Vendor names looked up by OUI (first three bytes of the MAC)
+CREATE TABLE IF NOT EXISTS vendor_cache (
+    oui TEXT PRIMARY KEY,
+    vendor TEXT,
+    checked_at INTEGER NOT NULL
+) WITHOUT ROWID;
+
+-- Covers per-device history reads (rssi included, id is the rowid)
+CREATE INDEX IF NOT EXISTS idx_sightings_mac_time_rssi ON sightings(mac, timestamp, rssi);
+DROP INDEX IF EXISTS idx_sightings_mac_time;
+-- Covers time-range scans that group by device
+CREATE INDEX IF NOT EXISTS idx_sightings_time_mac ON sightings(timestamp, mac);
+DROP INDEX IF EXISTS idx_sightings_timestamp;
+"""
+
+# Partial indexes on migrated columns, created once the columns exist.
+# Each covers only the matching rows and already holds them in list order.
+DEVICE_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_devices_active_lastseen ON devices(last_seen DESC) WHERE ignored = 0;
+CREATE INDEX IF NOT EXISTS idx_devices_watched ON devices(last_seen DESC) WHERE watched = 1;
 """
 
+# Bumped whenever init_db() gains a data migration (stored in PRAGMA user_version)
+SCHEMA_VERSION = 3
+
+BACKFILL_ROLLUP_SQL = """
+INSERT OR REPLACE INTO sighting_rollup_hour (mac, day, hour, count, sum_rssi, n_rssi)
+SELECT
+    mac,
+    date(timestamp, 'unixepoch', 'localtime'),
+    CAST(strftime('%H', timestamp, 'unixepoch', 'localtime') AS INTEGER),
+    COUNT(*),
+    COALESCE(SUM(rssi), 0),
+    COUNT(rssi)
+FROM sightings
+GROUP BY 1, 2, 3
+"""
+
+BACKFILL_SERVICE_UUIDS_SQL = """
+INSERT OR IGNORE INTO device_service_uuids (mac, uuid)
+SELECT devices.mac, uuids.value
+FROM devices, json_each(devices.service_uuids) AS uuids
+WHERE json_valid(devices.service_uuids)
+"""
+
+# Trigram full-text index over the searchable device fields. It keeps its
+# own copy of them and is joined back to devices on mac: the devices table
+# has a TEXT primary key, so its implicit rowid isn't stable (VACUUM may
+# renumber it) and can't link the two. The triggers only touch the index
+# when a searchable value actually changes, which is rare, so their scan
+# of the index by mac stays cheap.
+DEVICES_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE devices_fts USING fts5(
+    mac, friendly_name, vendor, tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS devices_fts_insert AFTER INSERT ON devices BEGIN
+    INSERT INTO devices_fts (mac, friendly_name, vendor)
+    VALUES (new.mac, new.friendly_name, new.vendor);
+END;
+
+CREATE TRIGGER IF NOT EXISTS devices_fts_delete AFTER DELETE ON devices BEGIN
+    DELETE FROM devices_fts WHERE mac = old.mac;
+END;
+
+CREATE TRIGGER IF NOT EXISTS devices_fts_update AFTER UPDATE OF friendly_name, vendor ON devices
+WHEN old.friendly_name IS NOT new.friendly_name OR old.vendor IS NOT new.vendor BEGIN
+    UPDATE devices_fts SET friendly_name = new.friendly_name, vendor = new.vendor
+    WHERE mac = old.mac;
+END;
+
+INSERT INTO devices_fts (mac, friendly_name, vendor)
+SELECT mac, friendly_name, vendor FROM devices;
+"""
+
+# Earlier versions built the index over devices' rowid; it is dropped and
+# rebuilt in the current form
+DROP_ROWID_FTS_SCHEMA = """
+DROP TRIGGER IF EXISTS devices_fts_insert;
+DROP TRIGGER IF EXISTS devices_fts_delete;
+DROP TRIGGER IF EXISTS devices_fts_update;
+DROP TABLE devices_fts;
+"""
+
+# Trigrams can't match fewer than three characters
+FTS_MIN_QUERY_LENGTH = 3
+
+# Timestamps are stored as unix epoch seconds
+TIMESTAMP_COLUMNS = [
+    ("devices", "first_seen"),
+    ("devices", "last_seen"),
+    ("sightings", "timestamp"),
+]
+
+
+# Connection tuning: WAL lets readers run alongside the writer and, with
+# synchronous=NORMAL, avoids an fsync on every commit. page_size only takes
+# effect on a new database, so it must come before the switch to WAL.
+PRAGMAS = f"""
+PRAGMA page_size = 8192;
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -{DB_CACHE_SIZE_MB * 1024};
+PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024};
+PRAGMA busy_timeout = 5000;
+"""
+
+
+# Rows fetched per worker-thread hop when iterating a cursor with async for
+ITER_CHUNK_SIZE = 1024
+
+
+async def _connect(read_only: bool = False) -> aiosqlite.Connection:
+    """Open a configured database connection."""
+    # A larger statement cache keeps the parsed form of every query we run
+    db = await aiosqlite.connect(DB_PATH, cached_statements=256, iter_chunk_size=ITER_CHUNK_SIZE)
+    db.row_factory = aiosqlite.Row
+    await db.executescript(PRAGMAS)
+    if read_only:
+        await db.execute("PRAGMA query_only = 1")
+        return db
+
+    async with db.execute("PRAGMA journal_mode") as cursor:
+        journal_mode = (await cursor.fetchone())[0]
+    if journal_mode.lower() != "wal":
+        logger.warning(f"Database is not in WAL mode (journal_mode={journal_mode})")
+
+    return db
+
+
+# Set by init_db() when the SQLite build supports FTS5 trigram indexes
+_has_fts = False
+
+# Shared connection, opened on first use and closed by close_db()
+_db: Optional[aiosqlite.Connection] = None
+_connect_lock = asyncio.Lock()
+# Serializes write transactions on the shared connection
+_write_lock = asyncio.Lock()
+
+
+async def _get_db() -> aiosqlite.Connection:
+    """Get the shared database connection, opening it if needed."""
+    global _db
+    if _db is None:
+        async with _connect_lock:
+            if _db is None:
+                _db = await _connect()
+    return _db
+
+
+@asynccontextmanager
+async def _transaction() -> AsyncIterator[aiosqlite.Connection]:
+    """Run a write transaction on the shared connection.
+
+    Commits on success and rolls back on error. Writers are serialized so
+    one caller's commit never includes another's half-finished changes.
+    """
+    async with _write_lock:
+        db = await _get_db()
+        try:
+            yield db
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+
+# Read-only connections for the longer queries (analytics, searches, device
+# lists). Each has its own thread, so with WAL they run in parallel with each
+# other and with the writer instead of queueing behind it.
+READ_POOL_SIZE = min(os.cpu_count() or 1, 4)
+_read_pool: Optional[asyncio.Queue[aiosqlite.Connection]] = None
+_read_connections: list[aiosqlite.Connection] = []
+
+
+async def _open_read_pool() -> asyncio.Queue[aiosqlite.Connection]:
+    """Get the read connection pool, opening its connections if needed."""
+    global _read_pool
+    if _read_pool is None:
+        async with _connect_lock:
+            if _read_pool is None:
+                pool: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+                for _ in range(READ_POOL_SIZE):
+                    db = await _connect(read_only=True)
+                    _read_connections.append(db)
+                    pool.put_nowait(db)
+                _read_pool = pool
+    return _read_pool
+
+
+@asynccontextmanager
+async def _read_db() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a read-only connection from the pool."""
+    pool = await _open_read_pool()
+    db = await pool.get()
+    try:
+        yield db
+    finally:
+        pool.put_nowait(db)
+
+
+async def close_db() -> None:
+    """Close the shared database connection and the read pool."""
+    global _db, _read_pool
+    _read_pool = None
+    for db in _read_connections:
+        await db.close()
+    _read_connections.clear()
+
+    if _db is not None:
+        # Refresh planner statistics for the tables this connection queried
+        await _db.execute("PRAGMA optimize")
+        await _db.close()
+        _db = None
+
 
 async def init_db() -> None:
     """Initialize the database schema."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.executescript(SCHEMA)
 
         # Migrations for devices table columns
@@ -123,70 +359,305 @@ async def init_db() -> None:
         for column, column_type in migrations:
             try:
                 await db.execute(f"ALTER TABLE devices ADD COLUMN {column} {column_type}")
-                await db.commit()
             except Exception:
                 pass  # Column already exists
 
-        await db.commit()
+        await db.executescript(DEVICE_INDEXES)
+        await _init_fts(db)
+
+        async with db.execute("PRAGMA user_version") as cursor:
+            version = (await cursor.fetchone())[0]
+
+        if version < 1:
+            # Convert local-time ISO strings to epoch seconds
+            for table, column in TIMESTAMP_COLUMNS:
+                await db.execute(
+                    f"UPDATE {table} SET {column} = CAST(strftime('%s', {column}, 'utc') AS INTEGER) "
+                    f"WHERE typeof({column}) = 'text'"
+                )
+
+        if version < 2:
+            # Build the hourly rollup from existing sightings
+            await db.execute(BACKFILL_ROLLUP_SQL)
+
+        if version < 3:
+            # Move service UUIDs out of the JSON column
+            await db.execute(BACKFILL_SERVICE_UUIDS_SQL)
+
+        if version < SCHEMA_VERSION:
+            await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        # Gather planner statistics once; PRAGMA optimize keeps them fresh
+        async with db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ) as cursor:
+            if await cursor.fetchone() is None:
+                await db.execute("ANALYZE")
+
+    # Open the read pool up front rather than on the first request
+    await _open_read_pool()
+
+
+async def _init_fts(db: aiosqlite.Connection) -> None:
+    """Create and fill the device search index if it doesn't exist yet."""
+    global _has_fts
+    async with db.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'devices_fts'"
+    ) as cursor:
+        row = await cursor.fetchone()
+    if row is not None:
+        if "content_rowid" not in row[0]:
+            _has_fts = True
+            return
+        await db.executescript(DROP_ROWID_FTS_SCHEMA)
+
+    try:
+        await db.executescript(DEVICES_FTS_SCHEMA)
+        _has_fts = True
+    except aiosqlite.OperationalError as e:
+        logger.warning(f"Full-text search unavailable, falling back to LIKE: {e}")
+
+
+def _to_datetime(timestamp: Optional[int]) -> Optional[datetime]:
+    """Convert a stored epoch timestamp to a local datetime."""
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
+
+def _to_isoformat(timestamp: Optional[int]) -> Optional[str]:
+    """Convert a stored epoch timestamp to a local ISO string."""
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
 
 
 def _parse_device_row(row) -> Device:
-    """Parse a database row into a Device object."""
-    keys = row.keys()
+    """Parse a database row into a Device object.
 
-    # Parse service_uuids from JSON
-    service_uuids = []
-    if "service_uuids" in keys and row["service_uuids"]:
-        try:
-            service_uuids = json.loads(row["service_uuids"])
-        except (json.JSONDecodeError, TypeError):
-            pass
+    Every column is present once init_db() has run its migrations.
+    """
+    # Service UUIDs are aggregated from device_service_uuids by the query
+    service_uuids = row["uuid_list"].split(",") if row["uuid_list"] else []
 
     return Device(
         mac=row["mac"],
         vendor=row["vendor"],
         friendly_name=row["friendly_name"],
-        device_type=row["device_type"] if "device_type" in keys else None,
+        device_type=row["device_type"],
         ignored=bool(row["ignored"]),
-        watched=bool(row["watched"]) if "watched" in keys else False,
-        first_seen=datetime.fromisoformat(row["first_seen"]) if row["first_seen"] else None,
-        last_seen=datetime.fromisoformat(row["last_seen"]) if row["last_seen"] else None,
+        watched=bool(row["watched"]),
+        first_seen=_to_datetime(row["first_seen"]),
+        last_seen=_to_datetime(row["last_seen"]),
         total_sightings=row["total_sightings"],
         service_uuids=service_uuids,
-        bt_type=row["bt_type"] if "bt_type" in keys and row["bt_type"] else "ble",
-        device_class=row["device_class"] if "device_class" in keys else None,
-        group_id=row["group_id"] if "group_id" in keys else None,
-        notes=row["notes"] if "notes" in keys else None,
+        bt_type=row["bt_type"] or "ble",
+        device_class=row["device_class"],
+        group_id=row["group_id"],
+        notes=row["notes"],
     )
 
 
+# LRU cache of devices by MAC, kept in sync by every write to the devices table
+DEVICE_CACHE_SIZE = 2048
+_device_cache: OrderedDict[str, Device] = OrderedDict()
+# Bumped on every invalidation so a read that raced a write isn't cached
+_device_cache_generation = 0
+
+
+def _cache_device(device: Device) -> None:
+    """Store a device in the cache, evicting the least recently used."""
+    _device_cache[device.mac] = device
+    _device_cache.move_to_end(device.mac)
+    if len(_device_cache) > DEVICE_CACHE_SIZE:
+        _device_cache.popitem(last=False)
+
+
+def _invalidate_device(mac: Optional[str] = None) -> None:
+    """Drop a device from the cache, or all devices if mac is None."""
+    global _device_cache_generation
+    _device_cache_generation += 1
+    if mac is None:
+        _device_cache.clear()
+    else:
+        _device_cache.pop(mac, None)
+
+
+# Device rows are selected with their service UUIDs as a comma-separated list
+UUID_LIST_SQL = "(SELECT group_concat(uuid, ',') FROM device_service_uuids WHERE mac = devices.mac) AS uuid_list"
+
+GET_DEVICE_SQL = f"SELECT *, {UUID_LIST_SQL} FROM devices WHERE mac = ?"
+GET_ALL_DEVICES_SQL = f"SELECT *, {UUID_LIST_SQL} FROM devices ORDER BY last_seen DESC"
+GET_ACTIVE_DEVICES_SQL = f"SELECT *, {UUID_LIST_SQL} FROM devices WHERE ignored = 0 ORDER BY last_seen DESC"
+
+
 async def get_device(mac: str) -> Optional[Device]:
     """Get a device by MAC address."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM devices WHERE mac = ?", (mac,)
-        ) as cursor:
+    device = _device_cache.get(mac)
+    if device is not None:
+        _device_cache.move_to_end(mac)
+        return device
+
+    generation = _device_cache_generation
+    # Read through the pool so an open transaction's uncommitted rows,
+    # which may still roll back, never reach the cache
+    async with _read_db() as db:
+        async with db.execute(GET_DEVICE_SQL, (mac,)) as cursor:
             row = await cursor.fetchone()
-            if row:
-                return _parse_device_row(row)
-            return None
+    if not row:
+        return None
+
+    device = _parse_device_row(row)
+    if generation == _device_cache_generation:
+        _cache_device(device)
+    return device
+
+
+# Most values bound in one IN (...) list, under SQLite's default parameter limit
+IN_LIST_CHUNK_SIZE = 500
+
+
+async def get_devices(macs: list[str]) -> dict[str, Device]:
+    """Get several devices by MAC address, keyed by MAC.
+
+    Cached devices are served directly; the rest are fetched with one
+    query per chunk. Unknown MACs are left out of the result.
+    """
+    devices = {}
+    missing = []
+    for mac in dict.fromkeys(macs):
+        device = _device_cache.get(mac)
+        if device is not None:
+            _device_cache.move_to_end(mac)
+            devices[mac] = device
+        else:
+            missing.append(mac)
+
+    generation = _device_cache_generation
+    async with _read_db() as db:
+        for i in range(0, len(missing), IN_LIST_CHUNK_SIZE):
+            chunk = missing[i:i + IN_LIST_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(
+                f"SELECT *, {UUID_LIST_SQL} FROM devices WHERE mac IN ({placeholders})", chunk
+            ) as cursor:
+                rows = await cursor.fetchall()
+            for row in rows:
+                device = _parse_device_row(row)
+                devices[device.mac] = device
+                if generation == _device_cache_generation:
+                    _cache_device(device)
+
+    return devices
 
 
 async def get_all_devices(include_ignored: bool = True) -> list[Device]:
     """Get all devices."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        query = "SELECT * FROM devices"
-        if not include_ignored:
-            query += " WHERE ignored = 0"
-        query += " ORDER BY last_seen DESC"
-
+    async with _read_db() as db:
+        query = GET_ALL_DEVICES_SQL if include_ignored else GET_ACTIVE_DEVICES_SQL
         async with db.execute(query) as cursor:
             rows = await cursor.fetchall()
             return [_parse_device_row(row) for row in rows]
 
 
+# Device fields for API responses, with timestamps formatted by SQLite
+ITER_DEVICES_SQL = """
+SELECT
+    mac, vendor, friendly_name, device_type, ignored,
+    strftime('%Y-%m-%dT%H:%M:%S', first_seen, 'unixepoch', 'localtime') || 'Z' AS first_seen,
+    strftime('%Y-%m-%dT%H:%M:%S', last_seen, 'unixepoch', 'localtime') || 'Z' AS last_seen,
+    total_sightings, {uuid_list}, device_class
+FROM devices
+{where}
+ORDER BY devices.last_seen DESC
+"""
+
+
+async def iter_devices(include_ignored: bool = True) -> AsyncIterator[dict]:
+    """Yield devices as plain dicts ready for JSON serialization.
+
+    Cheaper than get_all_devices() for callers that only serialize the
+    result, since no Device objects or datetimes are built.
+    """
+    async with _read_db() as db:
+        query = ITER_DEVICES_SQL.format(
+            uuid_list=UUID_LIST_SQL,
+            where="" if include_ignored else "WHERE ignored = 0",
+        )
+        async with db.execute(query) as cursor:
+            async for row in cursor:
+                device = dict(row)
+                device["ignored"] = bool(device["ignored"])
+                uuid_list = device.pop("uuid_list")
+                device["service_uuids"] = uuid_list.split(",") if uuid_list else []
+                yield device
+
+
+# Insert a device or merge a new sighting into the existing row. Missing
+# name/vendor/class/type are filled in but never overwritten, and seeing a
+# device over both BLE and classic marks it "both". Service UUIDs must be
+# inserted first so the returned uuid_list includes them.
+UPSERT_DEVICE_TEMPLATE = """
+INSERT INTO devices (
+    mac, vendor, friendly_name, device_type, first_seen, last_seen,
+    total_sightings, bt_type, device_class
+)
+VALUES (
+    ?, ?, ?, ?,
+    CAST(strftime('%s', 'now') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER),
+    1, ?, ?
+)
+ON CONFLICT(mac) DO UPDATE SET
+    last_seen = excluded.last_seen,
+    total_sightings = devices.total_sightings + 1,
+    friendly_name = COALESCE(NULLIF(devices.friendly_name, ''), excluded.friendly_name),
+    vendor = COALESCE(NULLIF(devices.vendor, ''), excluded.vendor),
+    bt_type = CASE
+        WHEN COALESCE(devices.bt_type, 'ble') = 'ble' AND excluded.bt_type = 'classic' THEN 'both'
+        WHEN devices.bt_type = 'classic' AND excluded.bt_type = 'ble' THEN 'both'
+        ELSE devices.bt_type
+    END,
+    device_class = COALESCE(NULLIF(devices.device_class, 0), excluded.device_class),
+    device_type = COALESCE(NULLIF(devices.device_type, ''), excluded.device_type)
+RETURNING {returning}
+"""
+
+UPSERT_DEVICE_SQL = UPSERT_DEVICE_TEMPLATE.format(returning=f"*, {UUID_LIST_SQL}")
+# For callers that only need to know whether the device is new
+UPSERT_DEVICE_COUNT_SQL = UPSERT_DEVICE_TEMPLATE.format(returning="total_sightings")
+
+INSERT_SERVICE_UUID_SQL = "INSERT OR IGNORE INTO device_service_uuids (mac, uuid) VALUES (?, ?)"
+
+
+async def _upsert_device_row(
+    db: aiosqlite.Connection,
+    mac: str,
+    vendor: Optional[str] = None,
+    friendly_name: Optional[str] = None,
+    rssi: Optional[int] = None,
+    service_uuids: Optional[list[str]] = None,
+    bt_type: str = "ble",
+    device_class: Optional[int] = None,
+    device_type: Optional[str] = None,
+    return_device: bool = False,
+) -> tuple[Optional[Device], bool]:
+    """Insert or update a device row on an open connection.
+
+    Returns tuple of (device, is_new), where device is None unless
+    return_device is set. Does not record a sighting or commit.
+    """
+    if service_uuids:
+        await db.executemany(INSERT_SERVICE_UUID_SQL, [(mac, uuid) for uuid in service_uuids])
+
+    async with db.execute(
+        UPSERT_DEVICE_SQL if return_device else UPSERT_DEVICE_COUNT_SQL,
+        (
+            mac, vendor or None, friendly_name or None, device_type or None,
+            bt_type, device_class or None,
+        )
+    ) as cursor:
+        row = await cursor.fetchone()
+
+    device = _parse_device_row(row) if return_device else None
+    return device, row["total_sightings"] == 1
+
+
 async def upsert_device(
     mac: str,
     vendor: Optional[str] = None,
@@ -195,195 +666,238 @@ async def upsert_device(
     service_uuids: Optional[list[str]] = None,
     bt_type: str = "ble",
     device_class: Optional[int] = None,
-) -> tuple[Device, bool]:
+    device_type: Optional[str] = None,
+    return_device: bool = False,
+) -> tuple[Optional[Device], bool]:
     """Insert or update a device and record a sighting.
 
+    device_type is only stored if the device doesn't have a type yet, so
+    manually assigned types are never overwritten.
+
     Returns tuple of (device, is_new) where is_new indicates first sighting.
+    device is None unless return_device is set.
     """
-    now = datetime.now()
-    uuids_json = json.dumps(service_uuids) if service_uuids else None
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        # Check if device exists
-        async with db.execute("SELECT * FROM devices WHERE mac = ?", (mac,)) as cursor:
-            existing = await cursor.fetchone()
-
-        is_new = existing is None
-
-        if existing:
-            # Build update based on what we have
-            updates = ["last_seen = ?", "total_sightings = total_sightings + 1"]
-            params = [now.isoformat()]
-
-            # Update friendly_name if we have one and device doesn't
-            if friendly_name and not existing["friendly_name"]:
-                updates.append("friendly_name = ?")
-                params.append(friendly_name)
-
-            # Update vendor if we have one and device doesn't
-            if vendor and not existing["vendor"]:
-                updates.append("vendor = ?")
-                params.append(vendor)
-
-            # Update/merge service_uuids if we have new ones
-            if service_uuids:
-                existing_uuids = []
-                if "service_uuids" in existing.keys() and existing["service_uuids"]:
-                    try:
-                        existing_uuids = json.loads(existing["service_uuids"])
-                    except (json.JSONDecodeError, TypeError):
-                        pass
-                # Merge UUIDs (keep unique)
-                merged = list(set(existing_uuids + service_uuids))
-                updates.append("service_uuids = ?")
-                params.append(json.dumps(merged))
-
-            # Update bt_type if we got classic BT info for a device we only had BLE for
-            existing_bt_type = existing["bt_type"] if "bt_type" in existing.keys() else "ble"
-            if bt_type == "classic" and existing_bt_type == "ble":
-                updates.append("bt_type = ?")
-                params.append("both")
-            elif bt_type == "ble" and existing_bt_type == "classic":
-                updates.append("bt_type = ?")
-                params.append("both")
-
-            # Update device_class if we have it and didn't before
-            existing_device_class = existing["device_class"] if "device_class" in existing.keys() else None
-            if device_class and not existing_device_class:
-                updates.append("device_class = ?")
-                params.append(device_class)
-
-            params.append(mac)
-            await db.execute(
-                f"UPDATE devices SET {', '.join(updates)} WHERE mac = ?",
-                params
-            )
-        else:
-            # Insert new device
-            await db.execute(
-                """
-                INSERT INTO devices (mac, vendor, friendly_name, first_seen, last_seen, total_sightings, service_uuids, bt_type, device_class)
-                VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?)
-                """,
-                (mac, vendor, friendly_name, now.isoformat(), now.isoformat(), uuids_json, bt_type, device_class)
-            )
+    results = await upsert_devices([{
+        "mac": mac,
+        "vendor": vendor,
+        "friendly_name": friendly_name,
+        "rssi": rssi,
+        "service_uuids": service_uuids,
+        "bt_type": bt_type,
+        "device_class": device_class,
+        "device_type": device_type,
+    }], return_devices=return_device)
+    return results[0]
+
+
+INSERT_SIGHTING_SQL = """
+INSERT INTO sightings (mac, timestamp, rssi)
+VALUES (?, CAST(strftime('%s', 'now') AS INTEGER), ?)
+"""
 
-        # Record sighting
-        await db.execute(
-            "INSERT INTO sightings (mac, timestamp, rssi) VALUES (?, ?, ?)",
-            (mac, now.isoformat(), rssi)
+UPSERT_ROLLUP_SQL = """
+INSERT INTO sighting_rollup_hour (mac, day, hour, count, sum_rssi, n_rssi)
+VALUES (
+    ?, date('now', 'localtime'), CAST(strftime('%H', 'now', 'localtime') AS INTEGER), 1, ?, ?
+)
+ON CONFLICT(mac, day, hour) DO UPDATE SET
+    count = count + 1,
+    sum_rssi = sum_rssi + excluded.sum_rssi,
+    n_rssi = n_rssi + excluded.n_rssi
+"""
+
+
+async def upsert_devices(
+    devices: list[dict], return_devices: bool = False
+) -> list[tuple[Optional[Device], bool]]:
+    """Insert or update several devices and record their sightings.
+
+    Each entry holds the keyword arguments of upsert_device. All rows are
+    written in a single transaction.
+
+    Returns a list of (device, is_new) tuples in the same order. Devices
+    are only built when return_devices is set, otherwise they are None.
+    """
+    if not devices:
+        return []
+
+    async with _transaction() as db:
+        results = [
+            await _upsert_device_row(db, **device, return_device=return_devices)
+            for device in devices
+        ]
+
+        # Record sightings
+        await db.executemany(
+            INSERT_SIGHTING_SQL,
+            [(device["mac"], device.get("rssi")) for device in devices]
+        )
+
+        # Keep the hourly rollup in step with the sightings
+        await db.executemany(
+            UPSERT_ROLLUP_SQL,
+            [
+                (device["mac"], device.get("rssi") or 0, 0 if device.get("rssi") is None else 1)
+                for device in devices
+            ]
         )
 
-        await db.commit()
+    if return_devices:
+        # The upsert returned the fresh rows, so refresh the cache with them
+        for device, _ in results:
+            _invalidate_device(device.mac)
+            _cache_device(device)
+    else:
+        for device in devices:
+            _invalidate_device(device["mac"])
 
-    device = await get_device(mac)
-    return device, is_new
+    return results
 
 
 async def set_friendly_name(mac: str, name: str) -> None:
     """Set a friendly name for a device."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.execute(
             "UPDATE devices SET friendly_name = ? WHERE mac = ?",
             (name, mac)
         )
-        await db.commit()
+    _invalidate_device(mac)
 
 
 async def set_ignored(mac: str, ignored: bool) -> None:
     """Set whether a device is ignored."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.execute(
             "UPDATE devices SET ignored = ? WHERE mac = ?",
             (1 if ignored else 0, mac)
         )
-        await db.commit()
+    _invalidate_device(mac)
 
 
 async def set_watched(mac: str, watched: bool) -> None:
     """Set whether a device is a Device of Interest (watched)."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.execute(
             "UPDATE devices SET watched = ? WHERE mac = ?",
             (1 if watched else 0, mac)
         )
-        await db.commit()
+    _invalidate_device(mac)
 
 
 async def set_device_type(mac: str, device_type: str) -> None:
     """Set the device type for a device."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.execute(
             "UPDATE devices SET device_type = ? WHERE mac = ?",
             (device_type, mac)
         )
-        await db.commit()
+    _invalidate_device(mac)
 
 
 async def set_device_notes(mac: str, notes: Optional[str]) -> None:
     """Set operator notes for a device."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.execute(
             "UPDATE devices SET notes = ? WHERE mac = ?",
             (notes if notes else None, mac)
         )
-        await db.commit()
+    _invalidate_device(mac)
 
 
-async def get_sightings(mac: str, days: int = 30) -> list[Sighting]:
-    """Get sightings for a device within the last N days."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT * FROM sightings
-            WHERE mac = ? AND timestamp > datetime('now', ?)
-            ORDER BY timestamp DESC
-            """,
-            (mac, f"-{days} days")
-        ) as cursor:
+GET_SIGHTINGS_SQL = """
+SELECT * FROM sightings
+WHERE mac = ? AND timestamp > CAST(strftime('%s', 'now', ?) AS INTEGER)
+ORDER BY timestamp DESC
+LIMIT ?
+"""
+
+
+async def get_sightings(mac: str, days: int = 30, limit: Optional[int] = None) -> list[Sighting]:
+    """Get sightings for a device within the last N days, newest first.
+
+    Pass limit to fetch only the most recent sightings.
+    """
+    # SQLite treats a negative LIMIT as no limit
+    limit = -1 if limit is None else limit
+    async with _read_db() as db:
+        async with db.execute(GET_SIGHTINGS_SQL, (mac, f"-{days} days", limit)) as cursor:
             rows = await cursor.fetchall()
             return [
                 Sighting(
                     id=row["id"],
                     mac=row["mac"],
-                    timestamp=datetime.fromisoformat(row["timestamp"]),
+                    timestamp=datetime.fromtimestamp(row["timestamp"]),
                     rssi=row["rssi"],
                 )
                 for row in rows
             ]
 
 
+# Rollup rows from the local hour N days ago onwards
+ROLLUP_SINCE = """
+(day, hour) >= (
+    date('now', ?, 'localtime'),
+    CAST(strftime('%H', 'now', ?, 'localtime') AS INTEGER)
+)
+"""
+ROLLUP_WINDOW = "mac = ? AND " + ROLLUP_SINCE
+
+
 async def get_hourly_distribution(mac: str, days: int = 30) -> dict[int, int]:
     """Get hourly distribution of sightings for pattern analysis."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _read_db() as db:
         async with db.execute(
-            """
-            SELECT strftime('%H', timestamp) as hour, COUNT(*) as count
-            FROM sightings
-            WHERE mac = ? AND timestamp > datetime('now', ?)
+            f"""
+            SELECT hour, SUM(count) as count
+            FROM sighting_rollup_hour
+            WHERE {ROLLUP_WINDOW}
             GROUP BY hour
             ORDER BY hour
             """,
-            (mac, f"-{days} days")
+            (mac, f"-{days} days", f"-{days} days")
         ) as cursor:
             rows = await cursor.fetchall()
-            return {int(row[0]): row[1] for row in rows}
+            return {row[0]: row[1] for row in rows}
+
+
+async def get_hourly_distributions(macs: list[str], days: int = 30) -> dict[str, dict[int, int]]:
+    """Get hourly distributions for several devices, keyed by MAC.
+
+    Devices with no sightings in the window map to an empty distribution.
+    """
+    distributions: dict[str, dict[int, int]] = {mac: {} for mac in macs}
+    macs = list(distributions)
+    async with _read_db() as db:
+        for i in range(0, len(macs), IN_LIST_CHUNK_SIZE):
+            chunk = macs[i:i + IN_LIST_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(
+                f"""
+                SELECT mac, hour, SUM(count) as count
+                FROM sighting_rollup_hour
+                WHERE mac IN ({placeholders}) AND {ROLLUP_SINCE}
+                GROUP BY mac, hour
+                ORDER BY mac, hour
+                """,
+                (*chunk, f"-{days} days", f"-{days} days")
+            ) as cursor:
+                async for row in cursor:
+                    distributions[row[0]][row[1]] = row[2]
+    return distributions
 
 
 async def get_daily_distribution(mac: str, days: int = 30) -> dict[int, int]:
     """Get daily distribution of sightings (0=Monday, 6=Sunday)."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _read_db() as db:
         async with db.execute(
-            """
-            SELECT strftime('%w', timestamp) as day, COUNT(*) as count
-            FROM sightings
-            WHERE mac = ? AND timestamp > datetime('now', ?)
-            GROUP BY day
-            ORDER BY day
+            f"""
+            SELECT strftime('%w', day) as weekday, SUM(count) as count
+            FROM sighting_rollup_hour
+            WHERE {ROLLUP_WINDOW}
+            GROUP BY weekday
+            ORDER BY weekday
             """,
-            (mac, f"-{days} days")
+            (mac, f"-{days} days", f"-{days} days")
         ) as cursor:
             rows = await cursor.fetchall()
             # SQLite %w: 0=Sunday, 1=Monday... Convert to 0=Monday
@@ -392,16 +906,17 @@ async def get_daily_distribution(mac: str, days: int = 30) -> dict[int, int]:
 
 async def get_daily_sightings(mac: str, days: int = 30) -> list[dict]:
     """Get daily sighting counts for timeline visualization."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _read_db() as db:
         async with db.execute(
-            """
-            SELECT date(timestamp) as date, COUNT(*) as count, AVG(rssi) as avg_rssi
-            FROM sightings
-            WHERE mac = ? AND timestamp > datetime('now', ?)
-            GROUP BY date(timestamp)
-            ORDER BY date ASC
+            f"""
+            SELECT day as date, SUM(count) as count,
+                   CAST(SUM(sum_rssi) AS REAL) / NULLIF(SUM(n_rssi), 0) as avg_rssi
+            FROM sighting_rollup_hour
+            WHERE {ROLLUP_WINDOW}
+            GROUP BY day
+            ORDER BY day ASC
             """,
-            (mac, f"-{days} days")
+            (mac, f"-{days} days", f"-{days} days")
         ) as cursor:
             rows = await cursor.fetchall()
             return [
@@ -414,79 +929,147 @@ async def get_daily_sightings(mac: str, days: int = 30) -> list[dict]:
             ]
 
 
+# Rows removed per cleanup transaction, so scans can write in between
+CLEANUP_CHUNK_SIZE = 5000
+
+DELETE_OLD_SIGHTINGS_SQL = """
+DELETE FROM sightings WHERE rowid IN (
+    SELECT rowid FROM sightings WHERE timestamp < ? LIMIT ?
+)
+"""
+
+
 async def cleanup_old_sightings(days: int = 90) -> int:
-    """Remove sightings older than N days. Returns count deleted."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            "DELETE FROM sightings WHERE timestamp < datetime('now', ?)",
+    """Remove sightings older than N days. Returns count deleted.
+
+    Deletes in chunks, releasing the write lock between them so a large
+    cleanup doesn't stall the scanner or WAL checkpoints. The daemon calls
+    this periodically with the configured retention period.
+    """
+    db = await _get_db()
+    # Statements outside _transaction() still hold the write lock, so they
+    # never run while a scan's transaction is open on the shared connection
+    async with _write_lock:
+        async with db.execute(
+            "SELECT CAST(strftime('%s', 'now', ?) AS INTEGER)", (f"-{days} days",)
+        ) as cursor:
+            cutoff = (await cursor.fetchone())[0]
+
+    total = 0
+    while True:
+        async with _transaction() as db:
+            cursor = await db.execute(DELETE_OLD_SIGHTINGS_SQL, (cutoff, CLEANUP_CHUNK_SIZE))
+            deleted = cursor.rowcount
+        total += deleted
+        if deleted < CLEANUP_CHUNK_SIZE:
+            break
+        await asyncio.sleep(0)
+
+    async with _transaction() as db:
+        await db.execute(
+            "DELETE FROM sighting_rollup_hour WHERE day < date('now', ?, 'localtime')",
             (f"-{days} days",)
         )
-        await db.commit()
-        return cursor.rowcount
+
+    if total:
+        # Shrink the WAL the deletes grew. Every chunk has committed.
+        async with _write_lock:
+            await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return total
+
+
+async def optimize_db() -> None:
+    """Let SQLite re-analyze any tables whose statistics have gone stale."""
+    db = await _get_db()
+    async with _write_lock:
+        await db.execute("PRAGMA optimize")
+
+
+SEARCH_DEVICES_BY_TEXT_SQL = """
+SELECT *, total_sightings as range_sightings,
+       first_seen as range_first, last_seen as range_last
+FROM devices
+WHERE mac LIKE ? OR friendly_name LIKE ? OR vendor LIKE ?
+ORDER BY last_seen DESC
+LIMIT ? OFFSET ?
+"""
+
+SEARCH_DEVICES_FTS_SQL = """
+SELECT d.*, d.total_sightings as range_sightings,
+       d.first_seen as range_first, d.last_seen as range_last
+FROM devices_fts
+JOIN devices d ON d.mac = devices_fts.mac
+WHERE devices_fts MATCH ?
+ORDER BY d.last_seen DESC
+LIMIT ? OFFSET ?
+"""
+
+SEARCH_ALL_DEVICES_SQL = """
+SELECT *, total_sightings as range_sightings,
+       first_seen as range_first, last_seen as range_last
+FROM devices
+ORDER BY last_seen DESC
+LIMIT ? OFFSET ?
+"""
+
+# Aggregate the sightings in range first, then join only the matching devices
+SEARCH_DEVICES_IN_RANGE_SQL = """
+WITH agg AS (
+    SELECT mac, COUNT(*) AS range_sightings,
+           MIN(timestamp) AS range_first, MAX(timestamp) AS range_last
+    FROM sightings
+    WHERE timestamp BETWEEN :start AND :end
+      AND (:mac IS NULL OR mac LIKE :mac)
+    GROUP BY mac
+)
+SELECT d.*, agg.range_sightings, agg.range_first, agg.range_last
+FROM agg
+JOIN devices d ON d.mac = agg.mac
+ORDER BY agg.range_sightings DESC
+LIMIT :limit OFFSET :offset
+"""
 
 
 async def search_devices(
     mac_filter: Optional[str] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
 ) -> list[dict]:
     """
     Search for devices by MAC and/or time range.
     Returns devices with sighting count in the specified range.
+    Use limit/offset to page through the results.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        # Build query based on filters
-        if start_time or end_time:
-            # Search by time range - find devices seen in that range
-            conditions = []
-            params = []
-
-            if mac_filter:
-                conditions.append("d.mac LIKE ?")
-                params.append(f"%{mac_filter}%")
-
-            if start_time:
-                conditions.append("s.timestamp >= ?")
-                params.append(start_time.isoformat())
-
-            if end_time:
-                conditions.append("s.timestamp <= ?")
-                params.append(end_time.isoformat())
-
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-
-            query = f"""
-                SELECT d.*, COUNT(s.id) as range_sightings,
-                       MIN(s.timestamp) as range_first,
-                       MAX(s.timestamp) as range_last
-                FROM devices d
-                JOIN sightings s ON d.mac = s.mac
-                WHERE {where_clause}
-                GROUP BY d.mac
-                ORDER BY range_sightings DESC
-            """
+    # SQLite treats a negative LIMIT as no limit
+    limit = -1 if limit is None else limit
+
+    # Build query based on filters
+    if start_time or end_time:
+        # Search by time range - find devices seen in that range
+        query = SEARCH_DEVICES_IN_RANGE_SQL
+        params = {
+            "start": int(start_time.timestamp()) if start_time else 0,
+            "end": int(end_time.timestamp()) if end_time else 2**62,
+            "mac": f"%{mac_filter}%" if mac_filter else None,
+            "limit": limit,
+            "offset": offset,
+        }
+    else:
+        # Just MAC filter, no time range
+        if mac_filter and _has_fts and len(mac_filter) >= FTS_MIN_QUERY_LENGTH:
+            # Quote as a phrase so the filter is matched as a plain substring
+            query = SEARCH_DEVICES_FTS_SQL
+            params = ['"' + mac_filter.replace('"', '""') + '"', limit, offset]
+        elif mac_filter:
+            query = SEARCH_DEVICES_BY_TEXT_SQL
+            params = [f"%{mac_filter}%", f"%{mac_filter}%", f"%{mac_filter}%", limit, offset]
         else:
-            # Just MAC filter, no time range
-            if mac_filter:
-                query = """
-                    SELECT *, total_sightings as range_sightings,
-                           first_seen as range_first, last_seen as range_last
-                    FROM devices
-                    WHERE mac LIKE ? OR friendly_name LIKE ? OR vendor LIKE ?
-                    ORDER BY last_seen DESC
-                """
-                params = [f"%{mac_filter}%", f"%{mac_filter}%", f"%{mac_filter}%"]
-            else:
-                query = """
-                    SELECT *, total_sightings as range_sightings,
-                           first_seen as range_first, last_seen as range_last
-                    FROM devices
-                    ORDER BY last_seen DESC
-                """
-                params = []
+            query = SEARCH_ALL_DEVICES_SQL
+            params = [limit, offset]
 
+    async with _read_db() as db:
         async with db.execute(query, params) as cursor:
             rows = await cursor.fetchall()
             return [
@@ -495,12 +1078,12 @@ async def search_devices(
                     "vendor": row["vendor"],
                     "friendly_name": row["friendly_name"],
                     "ignored": bool(row["ignored"]),
-                    "first_seen": row["first_seen"],
-                    "last_seen": row["last_seen"],
+                    "first_seen": _to_isoformat(row["first_seen"]),
+                    "last_seen": _to_isoformat(row["last_seen"]),
                     "total_sightings": row["total_sightings"],
                     "range_sightings": row["range_sightings"],
-                    "range_first": row["range_first"],
-                    "range_last": row["range_last"],
+                    "range_first": _to_isoformat(row["range_first"]),
+                    "range_last": _to_isoformat(row["range_last"]),
                 }
                 for row in rows
             ]
@@ -510,11 +1093,16 @@ async def search_devices(
 # Settings Management
 # ============================================================================
 
+# Statements are shared constants so the connection's statement cache
+# (keyed by SQL text) reuses their prepared form on every call
+GET_SETTINGS_SQL = "SELECT key, value FROM settings"
+SET_SETTING_SQL = "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)"
+
+
 async def get_settings() -> Settings:
     """Get all application settings."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT key, value FROM settings") as cursor:
+    async with _read_db() as db:
+        async with db.execute(GET_SETTINGS_SQL) as cursor:
             rows = await cursor.fetchall()
             settings_dict = {row["key"]: row["value"] for row in rows}
 
@@ -534,32 +1122,23 @@ async def get_settings() -> Settings:
 
 async def set_setting(key: str, value: str) -> None:
     """Set a single setting value."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-            (key, value)
-        )
-        await db.commit()
+    async with _transaction() as db:
+        await db.execute(SET_SETTING_SQL, (key, value))
 
 
 async def update_settings(settings: Settings) -> None:
     """Update all settings from a Settings object."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        settings_pairs = [
-            ("ntfy_topic", settings.ntfy_topic or ""),
-            ("ntfy_enabled", "1" if settings.ntfy_enabled else "0"),
-            ("notify_new_device", "1" if settings.notify_new_device else "0"),
-            ("notify_watched_return", "1" if settings.notify_watched_return else "0"),
-            ("notify_watched_leave", "1" if settings.notify_watched_leave else "0"),
-            ("watched_absence_minutes", str(settings.watched_absence_minutes)),
-            ("watched_return_minutes", str(settings.watched_return_minutes)),
-        ]
-        for key, value in settings_pairs:
-            await db.execute(
-                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-                (key, value)
-            )
-        await db.commit()
+    settings_pairs = [
+        ("ntfy_topic", settings.ntfy_topic or ""),
+        ("ntfy_enabled", "1" if settings.ntfy_enabled else "0"),
+        ("notify_new_device", "1" if settings.notify_new_device else "0"),
+        ("notify_watched_return", "1" if settings.notify_watched_return else "0"),
+        ("notify_watched_leave", "1" if settings.notify_watched_leave else "0"),
+        ("watched_absence_minutes", str(settings.watched_absence_minutes)),
+        ("watched_return_minutes", str(settings.watched_return_minutes)),
+    ]
+    async with _transaction() as db:
+        await db.executemany(SET_SETTING_SQL, settings_pairs)
 
 
 async def update_auth_settings(
@@ -568,87 +1147,101 @@ async def update_auth_settings(
     password_hash: Optional[str] = None
 ) -> None:
     """Update authentication settings."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-            ("auth_enabled", "1" if enabled else "0")
-        )
-        if username is not None:
-            await db.execute(
-                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-                ("auth_username", username)
-            )
-        if password_hash is not None:
-            await db.execute(
-                "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
-                ("auth_password_hash", password_hash)
-            )
-        await db.commit()
+    settings_pairs = [("auth_enabled", "1" if enabled else "0")]
+    if username is not None:
+        settings_pairs.append(("auth_username", username))
+    if password_hash is not None:
+        settings_pairs.append(("auth_password_hash", password_hash))
+
+    async with _transaction() as db:
+        await db.executemany(SET_SETTING_SQL, settings_pairs)
 
 
 # ============================================================================
 # Device Groups Management
 # ============================================================================
 
+GET_GROUPS_SQL = "SELECT * FROM device_groups ORDER BY name"
+SET_DEVICE_GROUP_SQL = "UPDATE devices SET group_id = ? WHERE mac = ?"
+
+
+# Groups change rarely but are read on every dashboard render, so they are
+# cached in memory and invalidated by every write to device_groups
+_groups_cache: Optional[list[DeviceGroup]] = None
+_groups_by_id: dict[int, DeviceGroup] = {}
+_groups_lock = asyncio.Lock()
+# Bumped on every invalidation so a read that raced a write isn't cached
+_groups_cache_generation = 0
+
+
+def _invalidate_groups() -> None:
+    """Drop the cached device groups."""
+    global _groups_cache, _groups_cache_generation
+    _groups_cache_generation += 1
+    _groups_cache = None
+    _groups_by_id.clear()
+
+
+async def _load_groups() -> list[DeviceGroup]:
+    """Return the cached device groups, querying them on a miss."""
+    global _groups_cache
+    async with _groups_lock:
+        if _groups_cache is None:
+            generation = _groups_cache_generation
+            async with _read_db() as db:
+                async with db.execute(GET_GROUPS_SQL) as cursor:
+                    groups = [
+                        DeviceGroup(
+                            id=row["id"],
+                            name=row["name"],
+                            color=row["color"] or "#3b82f6",
+                            icon=row["icon"] or "📁",
+                        )
+                        async for row in cursor
+                    ]
+            if generation != _groups_cache_generation:
+                return groups
+            _groups_cache = groups
+            _groups_by_id.update((group.id, group) for group in groups)
+        return _groups_cache
+
+
 async def get_groups() -> list[DeviceGroup]:
     """Get all device groups."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM device_groups ORDER BY name") as cursor:
-            rows = await cursor.fetchall()
-            return [
-                DeviceGroup(
-                    id=row["id"],
-                    name=row["name"],
-                    color=row["color"] or "#3b82f6",
-                    icon=row["icon"] or "📁",
-                )
-                for row in rows
-            ]
+    return list(await _load_groups())
 
 
 async def get_group(group_id: int) -> Optional[DeviceGroup]:
     """Get a device group by ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            "SELECT * FROM device_groups WHERE id = ?", (group_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return DeviceGroup(
-                    id=row["id"],
-                    name=row["name"],
-                    color=row["color"] or "#3b82f6",
-                    icon=row["icon"] or "📁",
-                )
-            return None
+    await _load_groups()
+    return _groups_by_id.get(group_id)
 
 
 async def create_group(name: str, color: str = "#3b82f6", icon: str = "📁") -> DeviceGroup:
     """Create a new device group."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         cursor = await db.execute(
             "INSERT INTO device_groups (name, color, icon) VALUES (?, ?, ?)",
             (name, color, icon)
         )
-        await db.commit()
-        return DeviceGroup(id=cursor.lastrowid, name=name, color=color, icon=icon)
+        group = DeviceGroup(id=cursor.lastrowid, name=name, color=color, icon=icon)
+    _invalidate_groups()
+    return group
 
 
 async def update_group(group_id: int, name: str, color: str, icon: str) -> None:
     """Update a device group."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         await db.execute(
             "UPDATE device_groups SET name = ?, color = ?, icon = ? WHERE id = ?",
             (name, color, icon, group_id)
         )
-        await db.commit()
+    _invalidate_groups()
 
 
 async def delete_group(group_id: int) -> None:
     """Delete a device group and unassign all devices."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _transaction() as db:
         # Unassign devices from this group
         await db.execute(
             "UPDATE devices SET group_id = NULL WHERE group_id = ?",
@@ -656,25 +1249,30 @@ async def delete_group(group_id: int) -> None:
         )
         # Delete the group
         await db.execute("DELETE FROM device_groups WHERE id = ?", (group_id,))
-        await db.commit()
+    _invalidate_device()
+    _invalidate_groups()
 
 
 async def set_device_group(mac: str, group_id: Optional[int]) -> None:
     """Assign a device to a group (or remove from group if None)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            "UPDATE devices SET group_id = ? WHERE mac = ?",
-            (group_id, mac)
-        )
-        await db.commit()
+    async with _transaction() as db:
+        await db.execute(SET_DEVICE_GROUP_SQL, (group_id, mac))
+    _invalidate_device(mac)
+
+
+async def set_devices_group(macs: list[str], group_id: Optional[int]) -> None:
+    """Assign several devices to a group (or remove them from groups if None)."""
+    async with _transaction() as db:
+        await db.executemany(SET_DEVICE_GROUP_SQL, [(group_id, mac) for mac in macs])
+    for mac in macs:
+        _invalidate_device(mac)
 
 
 async def get_devices_by_group(group_id: int) -> list[Device]:
     """Get all devices in a group."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read_db() as db:
         async with db.execute(
-            "SELECT * FROM devices WHERE group_id = ? ORDER BY last_seen DESC",
+            f"SELECT *, {UUID_LIST_SQL} FROM devices WHERE group_id = ? ORDER BY last_seen DESC",
             (group_id,)
         ) as cursor:
             rows = await cursor.fetchall()
@@ -683,38 +1281,116 @@ async def get_devices_by_group(group_id: int) -> list[Device]:
 
 async def get_watched_devices() -> list[Device]:
     """Get all watched (devices of interest)."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with _read_db() as db:
         async with db.execute(
-            "SELECT * FROM devices WHERE watched = 1 ORDER BY last_seen DESC"
+            f"SELECT *, {UUID_LIST_SQL} FROM devices WHERE watched = 1 ORDER BY last_seen DESC"
         ) as cursor:
             rows = await cursor.fetchall()
             return [_parse_device_row(row) for row in rows]
 
 
-async def get_rssi_history(mac: str, days: int = 7) -> list[dict]:
-    """Get RSSI history for a device for charting."""
-    async with aiosqlite.connect(DB_PATH) as db:
+async def get_rssi_history(mac: str, days: int = 7) -> dict[str, list[int]]:
+    """Get RSSI history for a device for charting.
+
+    Returned column-wise as {"timestamps": [...], "rssi": [...]}, with
+    timestamps in unix epoch seconds, to avoid building a dict per point.
+    """
+    async with _read_db() as db:
         async with db.execute(
             """
             SELECT timestamp, rssi
             FROM sightings
-            WHERE mac = ? AND rssi IS NOT NULL AND timestamp > datetime('now', ?)
+            WHERE mac = ? AND rssi IS NOT NULL AND timestamp > CAST(strftime('%s', 'now', ?) AS INTEGER)
             ORDER BY timestamp ASC
             """,
             (mac, f"-{days} days")
         ) as cursor:
-            rows = await cursor.fetchall()
-            return [
-                {"timestamp": row[0], "rssi": row[1]}
-                for row in rows
-            ]
+            # Stream rows into the columns rather than holding them all twice
+            timestamps = []
+            rssi = []
+            async for row in cursor:
+                timestamps.append(row[0])
+                rssi.append(row[1])
+
+    return {"timestamps": timestamps, "rssi": rssi}
+
+
+# ============================================================================
+# MAC Vendor Cache
+# ============================================================================
+
+SET_CACHED_VENDOR_SQL = """
+INSERT OR REPLACE INTO vendor_cache (oui, vendor, checked_at)
+VALUES (?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+"""
+
+
+async def get_cached_vendors(ouis: list[str]) -> dict[str, tuple[Optional[str], int]]:
+    """Get cached lookups for several OUIs ("AA:BB:CC"), keyed by OUI.
+
+    Each value is (vendor, checked_at epoch seconds); vendor is None for a
+    failed lookup. OUIs that have never been looked up are left out.
+    """
+    vendors = {}
+    async with _read_db() as db:
+        for i in range(0, len(ouis), IN_LIST_CHUNK_SIZE):
+            chunk = ouis[i:i + IN_LIST_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            async with db.execute(
+                f"SELECT oui, vendor, checked_at FROM vendor_cache WHERE oui IN ({placeholders})",
+                chunk,
+            ) as cursor:
+                async for row in cursor:
+                    vendors[row["oui"]] = (row["vendor"], row["checked_at"])
+    return vendors
+
+
+async def set_cached_vendor(oui: str, vendor: Optional[str]) -> None:
+    """Store the result of a vendor lookup for an OUI."""
+    async with _transaction() as db:
+        await db.execute(SET_CACHED_VENDOR_SQL, (oui, vendor))
 
 
 # ============================================================================
 # Dwell Time Analysis
 # ============================================================================
 
+# Split a device's sightings into sessions wherever the gap between two
+# sightings exceeds the threshold, then summarize the most recent sessions.
+# Totals are computed over all sessions before the LIMIT applies.
+DWELL_SESSIONS_SQL = """
+WITH gaps AS (
+    SELECT timestamp,
+           timestamp - LAG(timestamp) OVER (ORDER BY timestamp) AS gap
+    FROM sightings
+    WHERE mac = :mac AND timestamp > CAST(strftime('%s', 'now', :since) AS INTEGER)
+),
+numbered AS (
+    SELECT timestamp,
+           SUM(gap IS NULL OR gap > :gap) OVER (ORDER BY timestamp ROWS UNBOUNDED PRECEDING) AS session_id
+    FROM gaps
+),
+sessions AS (
+    SELECT session_id,
+           MIN(timestamp) AS start,
+           MAX(timestamp) AS end,
+           MAX(timestamp) - MIN(timestamp) AS duration
+    FROM numbered
+    GROUP BY session_id
+)
+SELECT
+    strftime('%Y-%m-%dT%H:%M:%S', start, 'unixepoch', 'localtime') || 'Z' AS start,
+    strftime('%Y-%m-%dT%H:%M:%S', end, 'unixepoch', 'localtime') || 'Z' AS end,
+    duration,
+    COUNT(*) OVER () AS session_count,
+    SUM(duration) OVER () AS total_duration,
+    MAX(duration) OVER () AS longest_duration
+FROM sessions
+ORDER BY session_id DESC
+LIMIT :max_sessions
+"""
+
+
 async def get_dwell_time(mac: str, days: int = 30, gap_minutes: int = 15) -> dict:
     """Calculate dwell time statistics for a device.
 
@@ -725,14 +1401,15 @@ async def get_dwell_time(mac: str, days: int = 30, gap_minutes: int = 15) -> dic
         dict with total_minutes, session_count, avg_session_minutes,
         longest_session_minutes, sessions list
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _read_db() as db:
         async with db.execute(
-            """
-            SELECT timestamp FROM sightings
-            WHERE mac = ? AND timestamp > datetime('now', ?)
-            ORDER BY timestamp ASC
-            """,
-            (mac, f"-{days} days")
+            DWELL_SESSIONS_SQL,
+            {
+                "mac": mac,
+                "since": f"-{days} days",
+                "gap": gap_minutes * 60,
+                "max_sessions": 10,  # Return last 10 sessions
+            }
         ) as cursor:
             rows = await cursor.fetchall()
 
@@ -745,44 +1422,23 @@ async def get_dwell_time(mac: str, days: int = 30, gap_minutes: int = 15) -> dic
             "sessions": []
         }
 
-    # Parse timestamps and calculate sessions
-    timestamps = [datetime.fromisoformat(row[0]) for row in rows]
-    gap_threshold = gap_minutes * 60  # Convert to seconds
-
-    sessions = []
-    session_start = timestamps[0]
-    session_end = timestamps[0]
-
-    for i in range(1, len(timestamps)):
-        gap = (timestamps[i] - session_end).total_seconds()
-        if gap > gap_threshold:
-            # End current session, start new one
-            duration = (session_end - session_start).total_seconds() / 60
-            sessions.append({
-                "start": session_start.isoformat() + "Z",
-                "end": session_end.isoformat() + "Z",
-                "duration_minutes": round(duration, 1)
-            })
-            session_start = timestamps[i]
-        session_end = timestamps[i]
-
-    # Don't forget the last session
-    duration = (session_end - session_start).total_seconds() / 60
-    sessions.append({
-        "start": session_start.isoformat() + "Z",
-        "end": session_end.isoformat() + "Z",
-        "duration_minutes": round(duration, 1)
-    })
-
-    total_minutes = sum(s["duration_minutes"] for s in sessions)
-    longest = max(s["duration_minutes"] for s in sessions) if sessions else 0
+    # Durations come back in seconds
+    session_count = rows[0]["session_count"]
+    total_minutes = rows[0]["total_duration"] / 60
 
     return {
         "total_minutes": round(total_minutes, 1),
-        "session_count": len(sessions),
-        "avg_session_minutes": round(total_minutes / len(sessions), 1) if sessions else 0,
-        "longest_session_minutes": round(longest, 1),
-        "sessions": sessions[-10:]  # Return last 10 sessions
+        "session_count": session_count,
+        "avg_session_minutes": round(total_minutes / session_count, 1),
+        "longest_session_minutes": round(rows[0]["longest_duration"] / 60, 1),
+        "sessions": [
+            {
+                "start": row["start"],
+                "end": row["end"],
+                "duration_minutes": round(row["duration"] / 60, 1),
+            }
+            for row in reversed(rows)
+        ]
     }
 
 
@@ -790,6 +1446,39 @@ async def get_dwell_time(mac: str, days: int = 30, gap_minutes: int = 15) -> dic
 # Device Correlation Analysis
 # ============================================================================
 
+# For each sighting of the target device, count the other devices seen
+# within the window. The correlation score (0-100) is the ratio of
+# co-occurrences to the target's own sightings in the period.
+# CROSS JOIN pins the join order so s2 is a time-range probe of
+# idx_sightings_time_mac; left to its statistics the planner prefers looping
+# over every device instead.
+CORRELATED_DEVICES_SQL = """
+WITH target AS (
+    SELECT COUNT(*) AS sightings FROM sightings
+    WHERE mac = :mac AND timestamp > CAST(strftime('%s', 'now', :since) AS INTEGER)
+)
+SELECT
+    s2.mac,
+    d.vendor,
+    d.friendly_name,
+    d.device_type,
+    COUNT(*) as co_occurrences,
+    d.total_sightings,
+    MIN(100, CAST(ROUND(COUNT(*) * 100.0 / (SELECT sightings FROM target)) AS INTEGER)) AS correlation_score
+FROM sightings s1
+CROSS JOIN sightings s2 ON s2.mac != s1.mac
+    AND s2.timestamp BETWEEN s1.timestamp - :window AND s1.timestamp + :window
+CROSS JOIN devices d ON d.mac = s2.mac
+WHERE s1.mac = :mac
+    AND s1.timestamp > CAST(strftime('%s', 'now', :since) AS INTEGER)
+    AND d.ignored = 0
+GROUP BY s2.mac
+HAVING co_occurrences >= 2
+ORDER BY co_occurrences DESC
+LIMIT 20
+"""
+
+
 async def get_correlated_devices(mac: str, days: int = 30, window_minutes: int = 5) -> list[dict]:
     """Find devices frequently seen around the same time as the target device.
 
@@ -803,74 +1492,26 @@ async def get_correlated_devices(mac: str, days: int = 30, window_minutes: int =
     Returns:
         List of correlated devices with correlation score
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-
-        # Get all sightings of the target device
-        async with db.execute(
-            """
-            SELECT timestamp FROM sightings
-            WHERE mac = ? AND timestamp > datetime('now', ?)
-            """,
-            (mac, f"-{days} days")
-        ) as cursor:
-            target_sightings = await cursor.fetchall()
-
-        if not target_sightings:
-            return []
-
-        target_count = len(target_sightings)
-
-        # For each target sighting, find other devices seen within the window
-        # Using a single query for efficiency
+    async with _read_db() as db:
         async with db.execute(
-            """
-            SELECT
-                s2.mac,
-                d.vendor,
-                d.friendly_name,
-                d.device_type,
-                COUNT(*) as co_occurrences,
-                d.total_sightings
-            FROM sightings s1
-            JOIN sightings s2 ON s2.mac != s1.mac
-                AND s2.timestamp BETWEEN datetime(s1.timestamp, ?) AND datetime(s1.timestamp, ?)
-            JOIN devices d ON d.mac = s2.mac
-            WHERE s1.mac = ?
-                AND s1.timestamp > datetime('now', ?)
-                AND d.ignored = 0
-            GROUP BY s2.mac
-            HAVING co_occurrences >= 2
-            ORDER BY co_occurrences DESC
-            LIMIT 20
-            """,
-            (f"-{window_minutes} minutes", f"+{window_minutes} minutes", mac, f"-{days} days")
+            CORRELATED_DEVICES_SQL,
+            {"mac": mac, "since": f"-{days} days", "window": window_minutes * 60}
         ) as cursor:
-            rows = await cursor.fetchall()
-
-        results = []
-        for row in rows:
-            # Calculate correlation score (0-100)
-            # Based on ratio of co-occurrences to target sightings
-            correlation = min(100, round((row["co_occurrences"] / target_count) * 100))
-
-            results.append({
-                "mac": row["mac"],
-                "vendor": row["vendor"],
-                "friendly_name": row["friendly_name"],
-                "device_type": row["device_type"],
-                "co_occurrences": row["co_occurrences"],
-                "total_sightings": row["total_sightings"],
-                "correlation_score": correlation
-            })
-
-        return results
+            return [dict(row) async for row in cursor]
 
 
 # ============================================================================
 # Proximity Zone Helpers
 # ============================================================================
 
+# Lower RSSI bound of each zone, strongest first; weaker signals are "remote"
+PROXIMITY_ZONE_THRESHOLDS = [
+    ("immediate", -50),
+    ("near", -65),
+    ("far", -80),
+]
+
+
 def rssi_to_proximity_zone(rssi: int) -> str:
     """Convert RSSI value to a proximity zone label.
 
@@ -882,14 +1523,34 @@ def rssi_to_proximity_zone(rssi: int) -> str:
     """
     if rssi is None:
         return "unknown"
-    if rssi >= -50:
-        return "immediate"
-    elif rssi >= -65:
-        return "near"
-    elif rssi >= -80:
-        return "far"
-    else:
-        return "remote"
+    return _PROXIMITY_ZONE_LUT[min(max(rssi, -128), 127) + 128]
+
+
+def _zone_for_rssi(rssi: int) -> str:
+    for zone, threshold in PROXIMITY_ZONE_THRESHOLDS:
+        if rssi >= threshold:
+            return zone
+    return "remote"
+
+
+# Zone for every RSSI a signed byte can hold, indexed by rssi + 128
+_PROXIMITY_ZONE_LUT = tuple(_zone_for_rssi(rssi) for rssi in range(-128, 128))
+
+
+# Count a device's readings per zone, bucketed with the same thresholds
+PROXIMITY_STATS_SQL = """
+SELECT
+    CASE
+        {cases}
+        ELSE 'remote'
+    END AS zone,
+    COUNT(*) AS count
+FROM sightings
+WHERE mac = ? AND rssi IS NOT NULL AND timestamp > CAST(strftime('%s', 'now', ?) AS INTEGER)
+GROUP BY zone
+""".format(cases="\n        ".join(
+    f"WHEN rssi >= {threshold} THEN '{zone}'" for zone, threshold in PROXIMITY_ZONE_THRESHOLDS
+))
 
 
 async def get_proximity_stats(mac: str, days: int = 7) -> dict:
@@ -897,21 +1558,13 @@ async def get_proximity_stats(mac: str, days: int = 7) -> dict:
 
     Returns distribution of sightings across proximity zones.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute(
-            """
-            SELECT rssi FROM sightings
-            WHERE mac = ? AND rssi IS NOT NULL AND timestamp > datetime('now', ?)
-            """,
-            (mac, f"-{days} days")
-        ) as cursor:
+    async with _read_db() as db:
+        async with db.execute(PROXIMITY_STATS_SQL, (mac, f"-{days} days")) as cursor:
             rows = await cursor.fetchall()
 
     zones = {"immediate": 0, "near": 0, "far": 0, "remote": 0}
     for row in rows:
-        zone = rssi_to_proximity_zone(row[0])
-        if zone in zones:
-            zones[zone] += 1
+        zones[row["zone"]] = row["count"]
 
     total = sum(zones.values())
     if total > 0:
@@ -44,6 +44,11 @@ class NotificationManager:
             self._session = None
         logger.info("Notification manager stopped")
 
+    @property
+    def enabled(self) -> bool:
+        """Whether notifications are turned on."""
+        return bool(self._settings and self._settings.ntfy_enabled)
+
     async def reload_settings(self) -> None:
         """Reload settings from database."""
         self._settings = await db.get_settings()
@@ -1,6 +1,7 @@
 """Traffic pattern analysis for bluehood."""
 
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
 from . import db
@@ -37,8 +38,8 @@ TIME_PERIOD_NAMES = {
 DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 
-def _get_period_for_hour(hour: int) -> str:
-    """Get the time period name for a given hour."""
+def _find_period_for_hour(hour: int) -> str:
+    """Find the time period name for a given hour."""
     for period, (start, end) in TIME_PERIODS.items():
         if period == "late_night":
             if 0 <= hour < 5:
@@ -48,6 +49,17 @@ def _get_period_for_hour(hour: int) -> str:
     return "unknown"
 
 
+# Time period for each hour of the day, indexed by hour
+_PERIOD_BY_HOUR = tuple(_find_period_for_hour(hour) for hour in range(24))
+
+
+def _get_period_for_hour(hour: int) -> str:
+    """Get the time period name for a given hour."""
+    if 0 <= hour < 24:
+        return _PERIOD_BY_HOUR[hour]
+    return "unknown"
+
+
 def _find_dominant_periods(hourly: dict[int, int], threshold: float = 0.6) -> list[str]:
     """Find time periods that account for the majority of sightings."""
     if not hourly:
@@ -126,6 +138,21 @@ def _analyze_time_pattern(hourly: dict[int, int]) -> str:
     return "Sporadic"
 
 
+@lru_cache(maxsize=4096)
+def _cached_time_pattern(hourly_key: tuple[tuple[int, int], ...]) -> str:
+    """Memoized _analyze_time_pattern, keyed by the sorted hourly items."""
+    return _analyze_time_pattern(dict(hourly_key))
+
+
+def describe_time_pattern(hourly: dict[int, int]) -> str:
+    """Describe when a device is usually seen from its hourly distribution.
+
+    Hourly distributions rarely change between refreshes, so results are
+    memoized by distribution.
+    """
+    return _cached_time_pattern(tuple(sorted(hourly.items())))
+
+
 def _analyze_day_pattern(daily: dict[int, int]) -> str:
     """Analyze daily distribution and return a description."""
     if not daily:
@@ -186,7 +213,7 @@ async def analyze_device_pattern(mac: str, days: int = 30) -> Pattern:
     daily = await db.get_daily_distribution(mac, days)
     sightings = await db.get_sightings(mac, days)
 
-    time_desc = _analyze_time_pattern(hourly)
+    time_desc = describe_time_pattern(hourly)
     day_desc = _analyze_day_pattern(daily)
     frequency = _analyze_frequency(len(sightings), days)
 
@@ -213,35 +240,31 @@ async def analyze_device_pattern(mac: str, days: int = 30) -> Pattern:
     )
 
 
-def generate_hourly_heatmap(hourly: dict[int, int], width: int = 24) -> str:
-    """Generate an ASCII heatmap of hourly activity."""
-    if not hourly:
-        return "No data"
-
-    max_count = max(hourly.values()) if hourly else 1
+@lru_cache(maxsize=256)
+def _render_heatmap(counts: tuple[int, ...]) -> str:
+    """Render counts as ASCII intensity blocks, memoized by counts."""
+    max_count = max(counts)
     blocks = " ░▒▓█"
 
     result = []
-    for hour in range(24):
-        count = hourly.get(hour, 0)
+    for count in counts:
         intensity = int((count / max_count) * (len(blocks) - 1)) if max_count > 0 else 0
         result.append(blocks[intensity])
 
     return "".join(result)
 
 
+def generate_hourly_heatmap(hourly: dict[int, int], width: int = 24) -> str:
+    """Generate an ASCII heatmap of hourly activity."""
+    if not hourly:
+        return "No data"
+
+    return _render_heatmap(tuple(hourly.get(hour, 0) for hour in range(24)))
+
+
 def generate_daily_heatmap(daily: dict[int, int]) -> str:
     """Generate an ASCII heatmap of daily activity."""
     if not daily:
         return "No data"
 
-    max_count = max(daily.values()) if daily else 1
-    blocks = " ░▒▓█"
-
-    result = []
-    for day in range(7):
-        count = daily.get(day, 0)
-        intensity = int((count / max_count) * (len(blocks) - 1)) if max_count > 0 else 0
-        result.append(blocks[intensity])
-
-    return "".join(result)
+    return _render_heatmap(tuple(daily.get(day, 0) for day in range(7)))
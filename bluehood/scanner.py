@@ -4,8 +4,9 @@ import asyncio
 import logging
 import re
 import subprocess
+import time
 from dataclasses import dataclass, field
-from typing import Callable, Optional
+from typing import Callable, ClassVar, Optional
 
 import aiohttp
 from bleak import BleakScanner
@@ -20,7 +21,12 @@ except ImportError:
 
 # Online API for vendor lookup fallback
 MACVENDORS_API_URL = "https://api.macvendors.com/"
+# Most online vendor lookups allowed in flight at once
+MACVENDORS_API_CONCURRENCY = 10
+# Seconds before an OUI the vendor API didn't know is looked up again
+VENDOR_RETRY_INTERVAL = 3600
 
+from . import db
 from .classifier import is_macos_uuid
 from .config import SCAN_DURATION, BLUETOOTH_ADAPTER, DATA_DIR
 
@@ -107,9 +113,28 @@ def parse_device_class(device_class: int) -> tuple[str, Optional[str]]:
     return major_type, minor_type
 
 
+def _parse_adapters(output: str) -> list[BluetoothAdapter]:
+    """Parse `bluetoothctl list` output into adapters."""
+    adapters = []
+    for line in output.splitlines():
+        if not line.startswith("Controller"):
+            continue
+        # "Controller <address> <alias...>"
+        _, _, rest = line.partition(" ")
+        address, _, alias = rest.partition(" ")
+        alias = alias.strip()
+        if address and alias:
+            # Assume hci naming convention
+            adapters.append(BluetoothAdapter(
+                name=f"hci{len(adapters)}",
+                address=address,
+                alias=alias
+            ))
+    return adapters
+
+
 def list_adapters() -> list[BluetoothAdapter]:
     """List available Bluetooth adapters."""
-    adapters = []
     try:
         # Use bluetoothctl to list adapters
         result = subprocess.run(
@@ -118,36 +143,58 @@ def list_adapters() -> list[BluetoothAdapter]:
             text=True,
             timeout=5
         )
-        idx = 0
-        for line in result.stdout.strip().split("\n"):
-            if line.startswith("Controller"):
-                parts = line.split()
-                if len(parts) >= 3:
-                    address = parts[1]
-                    alias = " ".join(parts[2:])
-                    # Assume hci naming convention
-                    hci_name = f"hci{idx}"
-                    idx += 1
-                    adapters.append(BluetoothAdapter(
-                        name=hci_name,
-                        address=address,
-                        alias=alias
-                    ))
+        return _parse_adapters(result.stdout)
     except FileNotFoundError:
         logger.warning("bluetoothctl not found - install bluez-utils")
     except Exception as e:
         logger.warning(f"Could not list adapters: {e}")
-    return adapters
+    return []
+
+
+async def list_adapters_async() -> list[BluetoothAdapter]:
+    """List available Bluetooth adapters without blocking the event loop."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "bluetoothctl", "list",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=5)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        return _parse_adapters(stdout.decode())
+    except FileNotFoundError:
+        logger.warning("bluetoothctl not found - install bluez-utils")
+    except Exception as e:
+        logger.warning(f"Could not list adapters: {e}")
+    return []
 
 
 class BluetoothScanner:
     """Bluetooth LE scanner."""
 
+    # Vendor lookups shared by every scanner instance (OUI -> (vendor, expiry)),
+    # backed by the vendor_cache table so they survive restarts. Successful
+    # lookups never expire; unknown OUIs are retried after VENDOR_RETRY_INTERVAL.
+    _vendor_cache: ClassVar[dict[str, tuple[Optional[str], float]]] = {}
+
     def __init__(self, adapter: Optional[str] = None):
         self.adapter = adapter or BLUETOOTH_ADAPTER
         self._mac_lookup: Optional[AsyncMacLookup] = None
-        self._vendor_cache: dict[str, Optional[str]] = {}
+        self._mac_lookup_lock = asyncio.Lock()
         self._vendors_updated = False
+        # Vendor lookups run concurrently, so the online fallback is both
+        # bounded and spaced out to respect the API's rate limit
+        self._api_semaphore = asyncio.Semaphore(MACVENDORS_API_CONCURRENCY)
+        self._api_rate_lock = asyncio.Lock()
+        self._last_api_call = 0.0
+        # Shared HTTP session so online lookups reuse one keep-alive connection
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Lookups in progress by OUI, so MACs sharing a vendor make one lookup
+        self._vendor_lookups: dict[str, asyncio.Task[Optional[str]]] = {}
 
     async def _ensure_vendor_db(self) -> None:
         """Ensure vendor database is up to date."""
@@ -169,6 +216,21 @@ class BluetoothScanner:
             logger.warning(f"Could not update vendor database: {e}")
             self._vendors_updated = True  # Don't retry
 
+    async def _get_mac_lookup(self) -> "AsyncMacLookup":
+        """Get the local vendor lookup, updating and loading it only once.
+
+        Vendor lookups run concurrently, so without the lock every lookup
+        on a cold start would download and parse the vendor list itself.
+        """
+        if self._mac_lookup is None:
+            async with self._mac_lookup_lock:
+                if self._mac_lookup is None:
+                    await self._ensure_vendor_db()
+                    mac_lookup = AsyncMacLookup()
+                    await mac_lookup.load_vendors()
+                    self._mac_lookup = mac_lookup
+        return self._mac_lookup
+
     def _is_randomized_mac(self, mac: str) -> bool:
         """Check if MAC address is locally administered (randomized).
 
@@ -186,79 +248,114 @@ class BluetoothScanner:
         except (ValueError, IndexError):
             return False
 
+    def _has_oui(self, mac: str) -> bool:
+        """Check whether a MAC address carries a vendor OUI."""
+        # macOS UUIDs have no OUI, and randomized MACs won't have vendors
+        return not is_macos_uuid(mac) and not self._is_randomized_mac(mac)
+
+    async def _load_cached_vendors(self, macs: list[str]) -> None:
+        """Load stored vendors for a scan's MACs in one query."""
+        ouis = {mac.upper()[:8] for mac in macs if self._has_oui(mac)}
+        missing = [oui for oui in ouis if oui not in self._vendor_cache]
+        if not missing:
+            return
+
+        try:
+            cached = await db.get_cached_vendors(missing)
+        except Exception as e:
+            logger.debug(f"Could not load cached vendors: {e}")
+            return
+
+        for oui, (vendor, checked_at) in cached.items():
+            expiry = float("inf") if vendor else checked_at + VENDOR_RETRY_INTERVAL
+            self._vendor_cache[oui] = (vendor, expiry)
+
     async def _get_vendor(self, mac: str) -> Optional[str]:
         """Look up vendor from MAC address OUI."""
-        # macOS UUIDs have no OUI - skip vendor lookup
-        if is_macos_uuid(mac):
+        if not self._has_oui(mac):
             return None
 
-        # Skip randomized MACs - they won't have vendors
-        if self._is_randomized_mac(mac):
-            return None
-
-        # Check cache first - only return if we have a successful lookup
-        if mac in self._vendor_cache and self._vendor_cache[mac] is not None:
-            return self._vendor_cache[mac]
-
+        # Check cache first - failed lookups are only retried once they expire
+        oui = mac.upper()[:8]
+        cached = self._vendor_cache.get(oui)
+        if cached is not None and time.time() < cached[1]:
+            return cached[0]
+
+        task = self._vendor_lookups.get(oui)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup_vendor(mac, oui))
+            self._vendor_lookups[oui] = task
+            task.add_done_callback(lambda _: self._vendor_lookups.pop(oui, None))
+        # Shielded so one cancelled caller doesn't cancel the others' lookup
+        return await asyncio.shield(task)
+
+    async def _lookup_vendor(self, mac: str, oui: str) -> Optional[str]:
+        """Look up and cache the vendor for an OUI missing from the cache."""
         vendor = None
 
         # Try local database first
         if HAS_MAC_LOOKUP:
             try:
-                if self._mac_lookup is None:
-                    await self._ensure_vendor_db()
-                    self._mac_lookup = AsyncMacLookup()
-
-                vendor = await self._mac_lookup.lookup(mac)
+                mac_lookup = await self._get_mac_lookup()
+                vendor = await mac_lookup.lookup(mac)
             except Exception:
                 pass  # Fall through to online API
 
         # Fallback to online API if local lookup failed
         if vendor is None:
-            vendor = await self._get_vendor_online(mac)
-
-        if vendor:
-            self._vendor_cache[mac] = vendor
+            try:
+                vendor = await self._get_vendor_online(oui)
+            except Exception as e:
+                # Rate limits, timeouts and network errors say nothing about
+                # the OUI, so the miss isn't cached and the next scan retries
+                logger.debug(f"Vendor API lookup failed for {oui}: {e!r}")
+                return None
+
+        vendor = vendor or None
+        expiry = float("inf") if vendor else time.time() + VENDOR_RETRY_INTERVAL
+        self._vendor_cache[oui] = (vendor, expiry)
+        try:
+            await db.set_cached_vendor(oui, vendor)
+        except Exception as e:
+            logger.debug(f"Could not store vendor for {oui}: {e}")
 
         return vendor
 
-    async def _get_vendor_online(self, mac: str) -> Optional[str]:
+    async def _get_vendor_online(self, oui: str) -> Optional[str]:
         """Look up vendor using MACVendors.com API.
 
-        Only sends the OUI (first 3 bytes) to protect privacy.
+        Only sends the OUI (first 3 bytes, e.g. "AA:BB:CC") to protect
+        privacy. Returns None when the API doesn't know the OUI and raises
+        on any other failure.
         """
-        # Extract OUI (first 3 bytes / 6 hex chars) for privacy
-        oui = mac[:8]  # e.g., "AA:BB:CC"
-
-        # Rate limit: 1 request per second
-        if hasattr(self, '_last_api_call'):
-            elapsed = asyncio.get_event_loop().time() - self._last_api_call
-            if elapsed < 1.0:
-                await asyncio.sleep(1.0 - elapsed)
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{MACVENDORS_API_URL}{oui}",
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    self._last_api_call = asyncio.get_event_loop().time()
-                    if response.status == 200:
-                        vendor = await response.text()
-                        return vendor.strip() if vendor else None
-                    elif response.status == 404:
-                        return None  # OUI not found in database
-                    elif response.status == 429:
-                        logger.debug("Vendor API rate limited")
-                        return None
-                    else:
-                        return None
-        except asyncio.TimeoutError:
-            logger.debug(f"Vendor API timeout for {oui}")
-            return None
-        except Exception as e:
-            logger.debug(f"Vendor API error for {oui}: {e}")
-            return None
+        async with self._api_semaphore:
+            # Rate limit: start at most 1 request per second
+            async with self._api_rate_lock:
+                elapsed = asyncio.get_running_loop().time() - self._last_api_call
+                if elapsed < 1.0:
+                    await asyncio.sleep(1.0 - elapsed)
+                self._last_api_call = asyncio.get_running_loop().time()
+
+            return await self._fetch_vendor_online(oui)
+
+    async def _fetch_vendor_online(self, oui: str) -> Optional[str]:
+        """Request the vendor for an OUI from MACVendors.com."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+
+        async with self._session.get(f"{MACVENDORS_API_URL}{oui}") as response:
+            if response.status == 404:
+                return None  # OUI not found in database
+            # Rate limiting (429) and server errors raise like timeouts do
+            response.raise_for_status()
+            vendor = await response.text()
+            return vendor.strip() if vendor else None
+
+    async def close(self) -> None:
+        """Close the HTTP session used for online vendor lookups."""
+        if self._session:
+            await self._session.close()
+            self._session = None
 
     async def scan_ble(self, duration: float = SCAN_DURATION) -> list[ScannedDevice]:
         """Perform a Bluetooth LE scan."""
@@ -273,11 +370,18 @@ class BluetoothScanner:
             if self.adapter:
                 kwargs["adapter"] = self.adapter
 
-            discovered = await BleakScanner.discover(**kwargs)
+            discovered = list((await BleakScanner.discover(**kwargs)).values())
+            macs = [device.address for device, _ in discovered]
+            await self._load_cached_vendors(macs)
+
+            # Look up all vendors concurrently rather than one after another
+            vendors = await asyncio.gather(
+                *(self._get_vendor(mac) for mac in macs), return_exceptions=True
+            )
 
-            for device, adv_data in discovered.values():
-                mac = device.address
-                vendor = await self._get_vendor(mac)
+            for (device, adv_data), mac, vendor in zip(discovered, macs, vendors):
+                if isinstance(vendor, Exception):
+                    vendor = None
 
                 # Capture service UUIDs for device fingerprinting
                 service_uuids = list(adv_data.service_uuids) if adv_data.service_uuids else []
@@ -330,6 +434,7 @@ class BluetoothScanner:
             # Parse hcitool output
             # Format: "	XX:XX:XX:XX:XX:XX	clock offset: 0x1234	class: 0x123456"
             output = stdout.decode()
+            found = []
             for line in output.strip().split("\n"):
                 if not line.strip() or line.startswith("Inquiring"):
                     continue
@@ -340,22 +445,29 @@ class BluetoothScanner:
                     line
                 )
                 if match:
-                    mac = match.group(1).upper()
-                    device_class = int(match.group(2), 16)
-
-                    # Try to get device name (separate call)
-                    name = await self._get_classic_device_name(mac, adapter_arg)
-                    vendor = await self._get_vendor(mac)
-
-                    devices.append(ScannedDevice(
-                        mac=mac,
-                        name=name,
-                        rssi=-60,  # hcitool doesn't provide RSSI, use placeholder
-                        vendor=vendor,
-                        service_uuids=[],
-                        bt_type="classic",
-                        device_class=device_class,
-                    ))
+                    found.append((match.group(1).upper(), int(match.group(2), 16)))
+
+            await self._load_cached_vendors([mac for mac, _ in found])
+
+            # Vendors are looked up concurrently while device names are fetched
+            names, vendors = await asyncio.gather(
+                self._get_classic_device_names([mac for mac, _ in found], adapter_arg),
+                asyncio.gather(*(self._get_vendor(mac) for mac, _ in found), return_exceptions=True),
+            )
+
+            for (mac, device_class), name, vendor in zip(found, names, vendors):
+                if isinstance(vendor, Exception):
+                    vendor = None
+
+                devices.append(ScannedDevice(
+                    mac=mac,
+                    name=name,
+                    rssi=-60,  # hcitool doesn't provide RSSI, use placeholder
+                    vendor=vendor,
+                    service_uuids=[],
+                    bt_type="classic",
+                    device_class=device_class,
+                ))
 
             logger.debug(f"Classic scan: found {len(devices)} devices")
 
@@ -368,6 +480,16 @@ class BluetoothScanner:
 
         return devices
 
+    async def _get_classic_device_names(
+        self, macs: list[str], adapter_arg: list[str]
+    ) -> list[Optional[str]]:
+        """Get names for several classic devices.
+
+        Remote name requests compete for the single controller and fail
+        quietly when they overlap, so they are made one at a time.
+        """
+        return [await self._get_classic_device_name(mac, adapter_arg) for mac in macs]
+
     async def _get_classic_device_name(
         self, mac: str, adapter_arg: list[str]
     ) -> Optional[str]:
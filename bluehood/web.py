@@ -970,6 +970,7 @@ HTML_TEMPLATE = """
         let selectedMacs = new Set();
         let lastSelectedIndex = null;
         let currentVisibleDevices = [];
+        let renderedDeviceListHtml = null;
 
         function toggleViewMode() {
             compactView = !compactView;
@@ -1049,13 +1050,43 @@ HTML_TEMPLATE = """
             document.getElementById('shortcuts-modal').classList.remove('active');
         }
 
-        async function refreshDevices() {
+        // Refreshes triggered while one is in flight collapse into a single re-run
+        let refreshInFlight = null;
+        let refreshPending = false;
+
+        function refreshDevices() {
+            if (refreshInFlight) {
+                refreshPending = true;
+                return refreshInFlight;
+            }
+            refreshInFlight = (async () => {
+                try {
+                    do {
+                        refreshPending = false;
+                        await loadDevices();
+                    } while (refreshPending);
+                } finally {
+                    refreshInFlight = null;
+                }
+            })();
+            return refreshInFlight;
+        }
+
+        async function loadDevices() {
             try {
                 const response = await fetch('/api/devices');
                 const data = await response.json();
-                allDevices = data.devices || [];
-                const knownMacs = new Set(allDevices.map(d => d.mac));
-                selectedMacs = new Set([...selectedMacs].filter(mac => knownMacs.has(mac)));
+                allDevices = withParsedLastSeen(data.devices || []);
+                if (lastSeenCache.size > allDevices.length) {
+                    // Forget devices that are no longer listed
+                    const listedMacs = new Set(allDevices.map(d => d.mac));
+                    lastSeenCache.forEach((_, mac) => { if (!listedMacs.has(mac)) lastSeenCache.delete(mac); });
+                }
+                if (selectedMacs.size > 0) {
+                    // Drop selections for devices that are gone
+                    const knownMacs = new Set(allDevices.map(d => d.mac));
+                    selectedMacs.forEach(mac => { if (!knownMacs.has(mac)) selectedMacs.delete(mac); });
+                }
                 updateStats(data);
                 updateFilterCounts();
                 if (!dateFilteredDevices) renderDevices();
@@ -1066,6 +1097,24 @@ HTML_TEMPLATE = """
             }
         }
 
+        // Parsed last_seen and its tooltip per MAC, reused while last_seen is unchanged
+        const lastSeenCache = new Map();
+
+        // Parse last_seen once per fetch rather than on every sort comparison and render
+        function withParsedLastSeen(devices) {
+            devices.forEach(d => {
+                let cached = lastSeenCache.get(d.mac);
+                if (!cached || cached.iso !== d.last_seen) {
+                    const ms = d.last_seen ? Date.parse(d.last_seen) : null;
+                    cached = { iso: d.last_seen, ms, tooltip: ms === null ? '' : new Date(ms).toLocaleString() };
+                    lastSeenCache.set(d.mac, cached);
+                }
+                d.lastSeenMs = cached.ms;
+                d.lastSeenTooltip = cached.tooltip;
+            });
+            return devices;
+        }
+
         function updateStats(data) {
             document.getElementById('stat-total').textContent = data.total || 0;
             document.getElementById('stat-today').textContent = data.active_today || 0;
@@ -1100,7 +1149,7 @@ HTML_TEMPLATE = """
                 if (endInput) url += 'end=' + encodeURIComponent(endInput);
                 const response = await fetch(url);
                 const data = await response.json();
-                dateFilteredDevices = data.devices || [];
+                dateFilteredDevices = withParsedLastSeen(data.devices || []);
                 renderDevices();
             } catch (error) { console.error('Query error:', error); }
         }
@@ -1156,10 +1205,8 @@ HTML_TEMPLATE = """
                 case 'sightings':
                     return Number.isFinite(device.total_sightings) ? device.total_sightings : -1;
                 case 'last_seen': {
-                    if (!device.last_seen) return Number.POSITIVE_INFINITY;
-                    const last = new Date(device.last_seen);
-                    const now = new Date();
-                    return Math.max(0, now - last);
+                    if (device.lastSeenMs === null) return Number.POSITIVE_INFINITY;
+                    return Math.max(0, Date.now() - device.lastSeenMs);
                 }
                 case 'group':
                     return (device.group_name || '').toLowerCase();
@@ -1334,14 +1381,15 @@ HTML_TEMPLATE = """
 
             if (sorted.length === 0) {
                 tbody.innerHTML = '<tr><td colspan="8" style="text-align: center; padding: 2rem; color: var(--text-muted);">No targets match criteria</td></tr>';
+                renderedDeviceListHtml = null;
                 updateSelectionUI();
                 return;
             }
 
-            tbody.innerHTML = sorted.map((d, index) => {
+            const html = sorted.map((d, index) => {
                 const typeClass = getTypeClass(d.device_type);
-                const { text: lastSeen, tooltip: lastSeenTooltip } = formatLastSeen(d.last_seen);
-                const isRecent = isRecentlySeen(d.last_seen);
+                const { text: lastSeen, tooltip: lastSeenTooltip } = formatLastSeen(d);
+                const isRecent = isRecentlySeen(d.lastSeenMs);
                 const watchedStar = d.watched ? '<span class="watched-star">★</span>' : '';
                 const isSelected = selectedMacs.has(d.mac);
                 const rowClass = isSelected ? 'selected' : '';
@@ -1385,6 +1433,11 @@ HTML_TEMPLATE = """
                     '<td class="group-name">' + groupHtml + '</td>' +
                     '</tr>';
             }).join('');
+            // Idle polls usually produce identical rows; skip rebuilding the table
+            if (html !== renderedDeviceListHtml) {
+                tbody.innerHTML = html;
+                renderedDeviceListHtml = html;
+            }
             updateSelectionUI();
         }
 
@@ -1393,11 +1446,11 @@ HTML_TEMPLATE = """
             return classes[type] || 'type-unknown';
         }
 
-        function formatLastSeen(isoString) {
-            if (!isoString) return { text: '—', tooltip: '' };
-            const date = new Date(isoString);
+        function formatLastSeen(d) {
+            if (d.lastSeenMs === null) return { text: '—', tooltip: '' };
+            const date = new Date(d.lastSeenMs);
             const now = new Date();
-            const tooltip = date.toLocaleString();
+            const tooltip = d.lastSeenTooltip;
             const diffMins = Math.floor((now - date) / 60000);
             let text;
             if (diffMins < 1) text = 'NOW';
@@ -1415,9 +1468,9 @@ HTML_TEMPLATE = """
             return { text, tooltip };
         }
 
-        function isRecentlySeen(isoString) {
-            if (!isoString) return false;
-            return (new Date() - new Date(isoString)) < 600000;
+        function isRecentlySeen(lastSeenMs) {
+            if (lastSeenMs === null) return false;
+            return (Date.now() - lastSeenMs) < 600000;
         }
 
         async function showDevice(mac) {
@@ -1560,13 +1613,11 @@ HTML_TEMPLATE = """
             const macs = Array.from(selectedMacs);
 
             try {
-                await Promise.all(macs.map(mac =>
-                    fetch('/api/device/' + encodeURIComponent(mac) + '/group', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({ group_id: groupId })
-                    })
-                ));
+                await fetch('/api/devices/group', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ macs: macs, group_id: groupId })
+                });
                 refreshDevices();
             } catch (error) {
                 console.error('Error applying bulk group:', error);
@@ -1712,7 +1763,7 @@ HTML_TEMPLATE = """
             try {
                 const response = await fetch('/api/device/' + encodeURIComponent(mac) + '/rssi?days=7');
                 const data = await response.json();
-                if (!data.rssi_history || data.rssi_history.length < 2) {
+                if (!data.rssi_history || data.rssi_history.rssi.length < 2) {
                     container.innerHTML = '<div style="color: var(--text-muted); font-size: 0.75rem; text-align: center; padding-top: 1.5rem;">Insufficient data</div>';
                     return;
                 }
@@ -1726,18 +1777,19 @@ HTML_TEMPLATE = """
             const width = container.clientWidth - 20;
             const height = 50;
             const padding = { left: 30, right: 10, top: 5, bottom: 15 };
-            const rssiValues = rssiData.map(d => d.rssi);
+            const rssiValues = rssiData.rssi;
+            const timestamps = rssiData.timestamps;
             const minRssi = Math.min(...rssiValues);
             const maxRssi = Math.max(...rssiValues);
-            const xScale = (i) => padding.left + (i / (rssiData.length - 1)) * (width - padding.left - padding.right);
+            const xScale = (i) => padding.left + (i / (rssiValues.length - 1)) * (width - padding.left - padding.right);
             const yScale = (rssi) => {
                 const range = maxRssi - minRssi || 1;
                 return padding.top + (1 - (rssi - minRssi) / range) * (height - padding.top - padding.bottom);
             };
-            const linePath = rssiData.map((d, i) => (i === 0 ? 'M' : 'L') + xScale(i) + ',' + yScale(d.rssi)).join(' ');
-            const areaPath = linePath + ' L' + xScale(rssiData.length - 1) + ',' + (height - padding.bottom) + ' L' + padding.left + ',' + (height - padding.bottom) + ' Z';
-            const firstTime = new Date(rssiData[0].timestamp);
-            const lastTime = new Date(rssiData[rssiData.length - 1].timestamp);
+            const linePath = rssiValues.map((rssi, i) => (i === 0 ? 'M' : 'L') + xScale(i) + ',' + yScale(rssi)).join(' ');
+            const areaPath = linePath + ' L' + xScale(rssiValues.length - 1) + ',' + (height - padding.bottom) + ' L' + padding.left + ',' + (height - padding.bottom) + ' Z';
+            const firstTime = new Date(timestamps[0] * 1000);
+            const lastTime = new Date(timestamps[timestamps.length - 1] * 1000);
             const formatTime = (d) => d.toLocaleDateString('en-US', { month: 'short', day: 'numeric' });
 
             container.innerHTML = '<svg viewBox="0 0 ' + width + ' ' + height + '" preserveAspectRatio="none">' +
@@ -1817,7 +1869,12 @@ HTML_TEMPLATE = """
             selectAllCheckbox.addEventListener('change', toggleSelectAllVisible);
         }
 
-        document.getElementById('search').addEventListener('input', renderDevices);
+        // Re-render once typing pauses rather than on every keystroke
+        let searchRenderTimer = null;
+        document.getElementById('search').addEventListener('input', () => {
+            clearTimeout(searchRenderTimer);
+            searchRenderTimer = setTimeout(renderDevices, 150);
+        });
         document.getElementById('device-modal').addEventListener('click', (e) => { if (e.target.id === 'device-modal') closeModal(); });
         document.getElementById('shortcuts-modal').addEventListener('click', (e) => { if (e.target.id === 'shortcuts-modal') closeShortcutsModal(); });
 
@@ -1863,7 +1920,21 @@ HTML_TEMPLATE = """
         loadGroupsForBulkSelect();
         updateSelectionUI();
         refreshDevices();
-        setInterval(refreshDevices, 10000);
+        // Don't poll while the tab is hidden; catch up once it is shown again
+        let refreshDeferred = false;
+        setInterval(() => {
+            if (document.hidden) {
+                refreshDeferred = true;
+                return;
+            }
+            refreshDevices();
+        }, 10000);
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden && refreshDeferred) {
+                refreshDeferred = false;
+                refreshDevices();
+            }
+        });
     </script>
 </body>
 </html>
@@ -2555,6 +2626,7 @@ class WebServer:
         self.app.router.add_get("/settings", self.settings_page)
         self.app.router.add_get("/about", self.about_page)
         self.app.router.add_get("/api/devices", self.api_devices)
+        self.app.router.add_post("/api/devices/group", self.api_set_devices_group)
         self.app.router.add_get("/api/device/{mac}", self.api_device)
         self.app.router.add_post("/api/device/{mac}/watch", self.api_toggle_watch)
         self.app.router.add_post("/api/device/{mac}/group", self.api_set_device_group)
@@ -2651,13 +2723,11 @@ class WebServer:
         total_sightings = 0
         randomized_count = 0
         identified_count = 0
-        type_set = set()
 
         device_list = []
         for d in devices:
             # Use service UUIDs for better classification
             device_type = d.device_type or classify_device(d.vendor, d.friendly_name, d.service_uuids, d.device_class)
-            type_set.add(device_type)
             total_sightings += d.total_sightings
 
             # Check if MAC is randomized (privacy feature)
@@ -2717,10 +2787,13 @@ class WebServer:
         if not device:
             return web.json_response({"error": "Device not found"}, status=404)
 
-        hourly = await db.get_hourly_distribution(mac, 30)
-        daily = await db.get_daily_distribution(mac, 30)
-        sightings = await db.get_sightings(mac, 30)
-        daily_timeline = await db.get_daily_sightings(mac, 30)
+        # Independent reads, so run them concurrently on the read pool
+        hourly, daily, sightings, daily_timeline = await asyncio.gather(
+            db.get_hourly_distribution(mac, 30),
+            db.get_daily_distribution(mac, 30),
+            db.get_sightings(mac, 30),
+            db.get_daily_sightings(mac, 30),
+        )
         device_type = device.device_type or classify_device(device.vendor, device.friendly_name, device.service_uuids, device.device_class)
 
         # Calculate pattern summary
@@ -2798,6 +2871,22 @@ class WebServer:
         except Exception as e:
             return web.json_response({"error": str(e)}, status=400)
 
+    async def api_set_devices_group(self, request: web.Request) -> web.Response:
+        """Set the group for several devices at once."""
+        try:
+            data = await request.json()
+            macs = data.get("macs")
+            if not isinstance(macs, list):
+                return web.json_response({"error": "Missing macs"}, status=400)
+            group_id = data.get("group_id")  # Can be None to remove from group
+
+            # One lookup for the whole selection; unknown MACs are skipped
+            devices = await db.get_devices(macs)
+            await db.set_devices_group(list(devices), group_id)
+            return web.json_response({"macs": list(devices), "group_id": group_id})
+        except Exception as e:
+            return web.json_response({"error": str(e)}, status=400)
+
     async def api_set_device_name(self, request: web.Request) -> web.Response:
         """Set the friendly name for a device."""
         mac = request.match_info["mac"]
@@ -2923,10 +3012,11 @@ class WebServer:
         end_dt = None
 
         try:
+            # fromisoformat accepts both "T" and space separators
             if start_str:
-                start_dt = datetime.fromisoformat(start_str.replace("T", " "))
+                start_dt = datetime.fromisoformat(start_str)
             if end_str:
-                end_dt = datetime.fromisoformat(end_str.replace("T", " "))
+                end_dt = datetime.fromisoformat(end_str)
         except ValueError:
             return web.json_response({"error": "Invalid datetime format"}, status=400)
 